@@ -0,0 +1,350 @@
+"""
+Reproducible benchmark of the capture pipeline against local fixture pages.
+
+A small HTTP server on 127.0.0.1 serves a static page, a sparse login form, a
+slow hydrating SPA, a page with heavy images, an endless scroll page and a page
+that stays blank.
+``process_website`` of both the screenshot and the GIF script is run against
+every fixture for each worker count and viewport set, and the throughput,
+peak RSS of the whole process tree (Chrome included) and per-stage latency
+are written to ``benchmark_results.json``. Nothing leaves the machine.
+
+Before any browser starts, ``check_content_detector`` runs the blank-screen
+detector against synthetic frames: sparse but real pages must count as
+content, blank frames, flat fills and spinners must not.
+"""
+import io
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+import gif_version
+from responsive_website_screenshotter import CollageRenderer, WebsiteScreenshotter, analyze_content, process_tree_rss
+
+PARAGRAPH = (
+    "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt "
+    "ut labore et dolore magna aliqua. Ut enim ad minim veniam, quis nostrud exercitation."
+)
+
+FIXTURES = {
+    'static': f"""<!DOCTYPE html>
+<html><head><meta name="viewport" content="width=device-width, initial-scale=1">
+<style>
+  body {{ font-family: sans-serif; margin: 0; }}
+  header {{ background: #1d3557; color: white; padding: 40px 20px; }}
+  section {{ padding: 20px; border-bottom: 1px solid #ddd; }}
+  section:nth-child(odd) {{ background: #f1faee; }}
+</style></head>
+<body>
+  <header><h1>Static fixture</h1><p>{PARAGRAPH}</p></header>
+  {''.join(f'<section><h2>Section {i}</h2><p>{PARAGRAPH}</p></section>' for i in range(12))}
+</body></html>""",
+
+    # Mostly background: a real page that a too eager blank detector rejects
+    'login': """<!DOCTYPE html>
+<html><head><meta name="viewport" content="width=device-width, initial-scale=1">
+<style>
+  body { font-family: sans-serif; margin: 0; background: white; }
+  form { max-width: 360px; margin: 120px auto; padding: 0 20px; }
+  input, button { display: block; width: 100%; box-sizing: border-box; margin: 12px 0; padding: 12px; font-size: 16px; }
+  input { border: 1px solid #ccc; border-radius: 6px; }
+  button { border: 0; border-radius: 6px; background: #2563eb; color: white; }
+</style></head>
+<body>
+  <form><h1>Sign in</h1><input placeholder="Email"><input type="password" placeholder="Password"><button>Log in</button></form>
+</body></html>""",
+
+    # Content only appears after a slow API call, like a client rendered app
+    'spa': f"""<!DOCTYPE html>
+<html><head><meta name="viewport" content="width=device-width, initial-scale=1">
+<style>
+  body {{ font-family: sans-serif; margin: 0; }}
+  .card {{ margin: 16px; padding: 16px; border-radius: 8px; background: #e63946; color: white; }}
+</style></head>
+<body>
+  <div id="root"></div>
+  <script>
+    fetch('/api/items').then(r => r.json()).then(items => {{
+      document.getElementById('root').innerHTML = items.map(
+        (item, i) => `<div class="card"><h2>${{item}}</h2><p>{PARAGRAPH}</p></div>`
+      ).join('');
+    }});
+  </script>
+</body></html>""",
+
+    'images': f"""<!DOCTYPE html>
+<html><head><meta name="viewport" content="width=device-width, initial-scale=1">
+<style>
+  body {{ margin: 0; }}
+  img {{ display: block; width: 100%; height: auto; }}
+</style></head>
+<body>
+  {''.join(f'<img src="/img/noise.png?n={i}" alt="noise {i}">' for i in range(8))}
+</body></html>""",
+
+    # Every time the sentinel becomes visible another batch of rows is appended
+    'scroll': f"""<!DOCTYPE html>
+<html><head><meta name="viewport" content="width=device-width, initial-scale=1">
+<style>
+  body {{ font-family: sans-serif; margin: 0; }}
+  .row {{ padding: 24px; border-bottom: 1px solid #ccc; }}
+  .row:nth-child(3n) {{ background: #a8dadc; }}
+</style></head>
+<body>
+  <div id="feed"></div>
+  <div id="sentinel">Loading...</div>
+  <script>
+    let count = 0;
+    function more() {{
+      const feed = document.getElementById('feed');
+      for (let i = 0; i < 20; i++) {{
+        const row = document.createElement('div');
+        row.className = 'row';
+        row.textContent = 'Row ' + (count++) + ' {PARAGRAPH}';
+        feed.appendChild(row);
+      }}
+    }}
+    more();
+    new IntersectionObserver(entries => {{
+      if (entries[0].isIntersecting) setTimeout(more, 200);
+    }}).observe(document.getElementById('sentinel'));
+  </script>
+</body></html>""",
+
+    'blank': """<!DOCTYPE html>
+<html><head><meta name="viewport" content="width=device-width, initial-scale=1"></head>
+<body style="background: white"></body></html>""",
+}
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    """Serves FIXTURES from memory; a few routes simulate slow or heavy responses"""
+
+    api_delay = 2.0
+    noise_png = None
+
+    def do_GET(self):
+        path = self.path.split('?')[0].strip('/')
+        if path in FIXTURES:
+            self.send_body(FIXTURES[path].encode('utf-8'), 'text/html; charset=utf-8')
+        elif path == 'api/items':
+            time.sleep(self.api_delay)
+            self.send_body(json.dumps([f"Item {i}" for i in range(10)]).encode('utf-8'), 'application/json')
+        elif path == 'img/noise.png':
+            self.send_body(self.noise_png, 'image/png')
+        else:
+            self.send_error(404)
+
+    def send_body(self, body: bytes, content_type: str) -> None:
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureServer:
+    """Background HTTP server for the fixture pages on a free local port"""
+
+    def __init__(self, noise_size: tuple = (1600, 1200)):
+        # Random noise does not compress, so every image really is heavy
+        noise = np.random.default_rng(0).integers(0, 256, (noise_size[1], noise_size[0], 3), dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(noise).save(buffer, 'PNG', compress_level=1)
+        FixtureHandler.noise_png = buffer.getvalue()
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FixtureHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def url(self, fixture: str) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}/{fixture}"
+
+
+class RSSMonitor:
+    """
+    Sample the summed resident memory of this process and all of its
+    descendants (chromedriver, Chrome and collage workers) from /proc
+    """
+
+    def __init__(self, interval: float = 0.2):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            self.peak = max(self.peak, process_tree_rss(os.getpid()))
+            if self._stop.wait(self.interval):
+                break
+
+
+def synthetic_frames(size: tuple = (1080, 2400)) -> Dict[str, tuple]:
+    """Frames drawn with Pillow and whether the detector must see content in them"""
+    width, height = size
+    fonts = CollageRenderer.FONTS['linux']
+
+    def font(points: int):
+        try:
+            return ImageFont.truetype(fonts['regular'], points)
+        except OSError:
+            return ImageFont.load_default(points)
+
+    login = Image.new('RGB', size, 'white')
+    draw = ImageDraw.Draw(login)
+    draw.text((100, 500), 'Sign in', font=font(72), fill=(20, 20, 20))
+    for y, label in ((700, 'Email'), (850, 'Password')):
+        draw.rounded_rectangle((100, y, width - 100, y + 110), 12, outline=(200, 200, 200), width=3)
+        draw.text((130, y + 35), label, font=font(36), fill=(150, 150, 150))
+    draw.rounded_rectangle((100, 1020, width - 100, 1130), 12, fill=(37, 99, 235))
+    draw.text((width // 2 - 70, 1055), 'Log in', font=font(40), fill='white')
+
+    dark_login = Image.new('RGB', size, (18, 18, 18))
+    draw = ImageDraw.Draw(dark_login)
+    draw.text((100, 500), 'Sign in', font=font(72), fill=(240, 240, 240))
+    draw.rounded_rectangle((100, 1020, width - 100, 1130), 12, fill=(37, 99, 235))
+
+    spinner = Image.new('RGB', size, 'white')
+    ImageDraw.Draw(spinner).arc(
+        (width // 2 - 50, height // 2 - 50, width // 2 + 50, height // 2 + 50), 0, 270, fill=(120, 120, 120), width=10
+    )
+    dark_spinner = Image.new('RGB', size, (30, 30, 30))
+    ImageDraw.Draw(dark_spinner).arc(
+        (width // 2 - 50, height // 2 - 50, width // 2 + 50, height // 2 + 50), 0, 270, fill=(200, 200, 200), width=10
+    )
+
+    return {
+        'login': (login, True),
+        'dark_login': (dark_login, True),
+        'blank': (Image.new('RGB', size, 'white'), False),
+        'grey_fill': (Image.new('RGB', size, (240, 240, 240)), False),
+        'spinner': (spinner, False),
+        'dark_spinner': (dark_spinner, False),
+    }
+
+
+def check_content_detector() -> None:
+    """Fail fast when the blank-screen detector misjudges a known frame"""
+    wrong = []
+    for name, (image, expected) in synthetic_frames().items():
+        stats = analyze_content(image)
+        if stats.has_content() != expected:
+            wrong.append(f"{name} (expected content={expected}, {stats})")
+    if wrong:
+        raise AssertionError("Blank-screen detector misjudged: " + "; ".join(wrong))
+    logging.info("Blank-screen detector accepts sparse pages and rejects blank frames")
+
+
+def run_case(tool: str, url: str, workers: int, viewports: List, output_dir: str) -> Dict:
+    """Run one process_website call and measure it"""
+    shutil.rmtree(output_dir, ignore_errors=True)
+
+    if tool == 'screenshots':
+        # No capture cache, every run has to hit the browser
+        screenshotter = WebsiteScreenshotter(output_dir=output_dir, max_workers=workers, cache_max_bytes=0)
+    else:
+        screenshotter = gif_version.WebsiteScreenshotter(output_dir=output_dir, max_workers=workers)
+    screenshotter.VIEWPORTS = viewports
+
+    try:
+        with RSSMonitor() as monitor:
+            start = time.perf_counter()
+            screenshotter.process_website(url)
+            elapsed = time.perf_counter() - start
+    finally:
+        if tool == 'screenshots':
+            screenshotter.close()
+
+    extension = '.png' if tool == 'screenshots' else '.gif'
+    captures = sum(
+        1 for name in os.listdir(output_dir)
+        if name.startswith('screenshot-') and name.endswith(extension)
+    )
+
+    stages = screenshotter.timings.summary()
+    return {
+        'seconds': round(elapsed, 3),
+        'captures': captures,
+        'captures_per_minute': round(captures / elapsed * 60, 2) if elapsed else 0.0,
+        'peak_rss_mb': round(monitor.peak / (1024 * 1024), 1),
+        'stages': stages,
+    }
+
+
+def run_benchmark(output_dir: str, fixtures: List[str], tools: List[str], worker_counts: List[int],
+                  viewport_sets: Dict[str, int], repeats: int = 1) -> List[Dict]:
+    results = []
+    os.makedirs(output_dir, exist_ok=True)
+    check_content_detector()
+
+    with FixtureServer() as server:
+        for tool in tools:
+            all_viewports = WebsiteScreenshotter.VIEWPORTS if tool == 'screenshots' else gif_version.WebsiteScreenshotter.VIEWPORTS
+            for fixture in fixtures:
+                for workers in worker_counts:
+                    for set_name, count in viewport_sets.items():
+                        viewports = all_viewports[:count] if count else list(all_viewports)
+                        for repeat in range(repeats):
+                            case_dir = os.path.join(output_dir, f"{tool}-{fixture}-w{workers}-{set_name}-{repeat}")
+                            result = run_case(tool, server.url(fixture), workers, viewports, case_dir)
+                            result.update({
+                                'tool': tool,
+                                'fixture': fixture,
+                                'workers': workers,
+                                'viewports': set_name,
+                                'viewport_count': len(viewports),
+                                'repeat': repeat,
+                            })
+                            results.append(result)
+                            logging.info(
+                                f"[{tool}] {fixture} workers={workers} viewports={set_name}: "
+                                f"{result['captures']}/{len(viewports)} captures in {result['seconds']}s, "
+                                f"{result['captures_per_minute']} captures/min, peak RSS {result['peak_rss_mb']} MB"
+                            )
+
+    with open(os.path.join(output_dir, 'benchmark_results.json'), 'w') as f:
+        json.dump(results, f, indent=2)
+    return results
+
+
+def main():
+    OUTPUT_DIR = "benchmark_output"  # Per-case output and benchmark_results.json
+    FIXTURES_TO_RUN = ['static', 'login', 'spa', 'images', 'scroll', 'blank']
+    TOOLS = ['screenshots', 'gif']  # responsive_website_screenshotter.py and gif_version.py
+    WORKER_COUNTS = [1, 2, 4]
+    VIEWPORT_SETS = {'single': 1, 'all': 0}  # Number of leading viewports, 0 for every viewport
+    REPEATS = 1
+
+    run_benchmark(OUTPUT_DIR, FIXTURES_TO_RUN, TOOLS, WORKER_COUNTS, VIEWPORT_SETS, REPEATS)
+
+
+if __name__ == "__main__":
+    main()
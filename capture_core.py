@@ -0,0 +1,483 @@
+"""
+Capture building blocks shared by the Selenium screenshotter and the CDP backend.
+
+Both responsive_website_screenshotter.py and cdp_capture.py import from here,
+so running the screenshotter as a script never loads a second copy of itself.
+"""
+import asyncio
+import hashlib
+import io
+import json
+import os
+import random
+import shutil
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import numpy as np
+from PIL import Image
+from selenium import webdriver
+from selenium.common.exceptions import (
+    InvalidSessionIdException,
+    JavascriptException,
+    NoSuchWindowException,
+    TimeoutException,
+    WebDriverException,
+)
+from urllib3.exceptions import MaxRetryError, ProtocolError
+
+
+@dataclass
+class Viewport:
+    width: int
+    height: int
+    name: str
+    dpr: float
+    user_agent: str
+
+
+@dataclass
+class Capture:
+    """
+    Screenshot as returned by the browser plus its decoded image. A stitched
+    full page is already on disk at ``path``; png and image then hold its
+    first viewport only.
+    """
+    png: bytes
+    image: Image.Image
+    path: Optional[str] = None
+
+
+class BlankPageError(WebDriverException):
+    """The page loaded but the screenshot shows no real content yet"""
+
+
+CRASH_MARKERS = (
+    'chrome not reachable', 'session deleted', 'invalid session', 'disconnected',
+    'tab crashed', 'target crashed', 'no such window', 'connection closed', 'connection lost',
+    'connection refused', 'connection reset', 'max retries exceeded', 'failed to establish a new connection',
+)
+
+
+def classify_failure(error: BaseException) -> str:
+    """
+    Sort a failed capture attempt into the class that decides how to retry:
+    'blank', 'timeout', 'crash', 'script' or 'other'
+    """
+    if isinstance(error, BlankPageError):
+        return 'blank'
+    if isinstance(error, (TimeoutException, TimeoutError, asyncio.TimeoutError)):
+        return 'timeout'
+    if isinstance(error, (InvalidSessionIdException, NoSuchWindowException)):
+        return 'crash'
+    if isinstance(error, (ConnectionError, MaxRetryError, ProtocolError)):
+        # chromedriver or the DevTools socket went away
+        return 'crash'
+    if isinstance(error, JavascriptException):
+        return 'script'
+
+    message = str(error).lower()
+    if any(marker in message for marker in CRASH_MARKERS):
+        return 'crash'
+    if 'timeout' in message or 'timed out' in message:
+        return 'timeout'
+    if 'script error' in message or 'javascript error' in message:
+        return 'script'
+    return 'other'
+
+
+def retry_delay(failure: str, count: int, base: float = 1.0, cap: float = 30.0) -> float:
+    """
+    Seconds to wait before retrying after the ``count``-th failure of a class.
+    Timeouts back off exponentially with full jitter, so retries against a
+    struggling server spread out; blank pages and crashes retry at once (the
+    re-wait or the browser start is delay enough).
+    """
+    if failure in ('blank', 'crash'):
+        return 0.0
+    if failure == 'script':
+        base = base / 2
+    return random.uniform(0, min(cap, base * 2 ** (count - 1)))
+
+
+class NetworkIdleTracker:
+    """
+    Track in-flight requests from CDP Network events.
+
+    The Selenium backend feeds it from Chrome's performance log, the CDP
+    backend from websocket events. Up to ``max_inflight`` long-lived requests
+    (analytics beacons, websockets, polling) are tolerated.
+    """
+
+    def __init__(self, max_inflight: int = 2):
+        self.max_inflight = max_inflight
+        self.inflight = set()
+        self.last_activity = time.monotonic()
+
+    def handle_event(self, method: str, params: Dict) -> None:
+        if method == 'Network.requestWillBeSent':
+            self.inflight.add(params.get('requestId'))
+            self.last_activity = time.monotonic()
+        elif method in ('Network.loadingFinished', 'Network.loadingFailed'):
+            self.inflight.discard(params.get('requestId'))
+            self.last_activity = time.monotonic()
+
+    def is_idle(self, quiet_period: float) -> bool:
+        return (len(self.inflight) <= self.max_inflight and
+                time.monotonic() - self.last_activity >= quiet_period)
+
+    def poll(self, driver: webdriver.Chrome) -> None:
+        try:
+            entries = driver.get_log('performance')
+        except Exception:
+            return
+        for entry in entries:
+            message = json.loads(entry['message']).get('message', {})
+            self.handle_event(message.get('method', ''), message.get('params', {}))
+
+    def reset(self, driver: webdriver.Chrome) -> None:
+        """Drop events left over from a previous page"""
+        self.poll(driver)
+        self.inflight.clear()
+        self.last_activity = time.monotonic()
+
+    def wait_for_idle(self, driver: webdriver.Chrome, deadline: float, quiet_period: float) -> bool:
+        while time.monotonic() < deadline:
+            self.poll(driver)
+            if self.is_idle(quiet_period):
+                return True
+            time.sleep(0.1)
+        return False
+
+
+class CaptureCache:
+    """
+    Content-addressed on-disk cache of screenshots.
+
+    Entries are keyed by a hash of the url, the viewport fields and a page
+    fingerprint, stored as ``<key>.png`` and indexed in SQLite. When the cache
+    grows beyond ``max_bytes`` the least recently used entries are removed.
+    """
+
+    suffix = '.png'
+    index_name = 'index.sqlite3'
+
+    def __init__(self, cache_dir: str, max_bytes: int = 1 << 30):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(cache_dir, self.index_name), check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+
+    @staticmethod
+    def make_key(url: str, viewport: Viewport, fingerprint: str, variant: str = '') -> str:
+        fields = [url, viewport.width, viewport.height, viewport.dpr, viewport.user_agent, fingerprint, variant]
+        return hashlib.sha256(json.dumps(fields).encode('utf-8')).hexdigest()
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}{self.suffix}")
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            try:
+                with open(self.path_for(key), 'rb') as f:
+                    png = f.read()
+            except OSError:
+                with self._db:
+                    self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                return None
+            with self._db:
+                self._db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+        return png
+
+    def put(self, key: str, png: bytes) -> None:
+        path = self.path_for(key)
+        with open(path + '.part', 'wb') as f:
+            f.write(png)
+        os.replace(path + '.part', path)
+        self._index(key, len(png))
+
+    def put_file(self, key: str, source: str) -> None:
+        """Store a screenshot that is already on disk without reading it into memory"""
+        path = self.path_for(key)
+        shutil.copyfile(source, path + '.part')
+        os.replace(path + '.part', path)
+        self._index(key, os.path.getsize(path))
+
+    def _index(self, key: str, size: int) -> None:
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, size, last_access) VALUES (?, ?, ?)",
+                (key, size, time.time())
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self.path_for(key))
+            except OSError:
+                pass
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+
+    def clear(self) -> None:
+        """Remove every indexed entry; other files in the directory are left alone"""
+        with self._lock, self._db:
+            for (key,) in self._db.execute("SELECT key FROM entries").fetchall():
+                try:
+                    os.remove(self.path_for(key))
+                except OSError:
+                    pass
+            self._db.execute("DELETE FROM entries")
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class BandedPNGWriter:
+    """
+    Write an RGB PNG band by band, so the whole image never has to be in memory.
+
+    Rows are "Up"-filtered with NumPy and deflated incrementally into IDAT
+    chunks. The file is written next to its destination and moved into place
+    by close().
+    """
+
+    CHUNK_SIZE = 1 << 20
+    ROWS_PER_STEP = 256
+
+    def __init__(self, path: str, width: int, height: int, compress_level: int = 9):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+
+        self._file = open(path + '.part', 'wb')
+        self._compressor = zlib.compressobj(compress_level)
+        self._previous = np.zeros(width * 3, dtype=np.uint8)
+        self._pending = bytearray()
+
+        self._file.write(b'\x89PNG\r\n\x1a\n')
+        self._write_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+
+    def _write_chunk(self, tag: bytes, data: bytes) -> None:
+        self._file.write(struct.pack('>I', len(data)))
+        self._file.write(tag)
+        self._file.write(data)
+        self._file.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(tag)) & 0xFFFFFFFF))
+
+    def _flush_idat(self, force: bool = False) -> None:
+        if self._pending and (force or len(self._pending) >= self.CHUNK_SIZE):
+            self._write_chunk(b'IDAT', bytes(self._pending))
+            self._pending.clear()
+
+    def write_band(self, band: Image.Image) -> None:
+        if band.width != self.width or self.rows_written + band.height > self.height:
+            raise ValueError("Band does not fit the image")
+        if band.mode != 'RGB':
+            band = band.convert('RGB')
+
+        rows = np.asarray(band).reshape(band.height, self.width * 3)
+        for start in range(0, len(rows), self.ROWS_PER_STEP):
+            chunk = rows[start:start + self.ROWS_PER_STEP]
+            previous = np.vstack([self._previous[np.newaxis], chunk[:-1]])
+
+            # Filter type 2 ("Up"), uint8 arithmetic wraps modulo 256 as PNG expects
+            filtered = np.empty((len(chunk), self.width * 3 + 1), dtype=np.uint8)
+            filtered[:, 0] = 2
+            np.subtract(chunk, previous, out=filtered[:, 1:])
+
+            self._pending += self._compressor.compress(filtered.tobytes())
+            self._previous = chunk[-1].copy()
+            self._flush_idat()
+
+        self.rows_written += band.height
+
+    def close(self) -> str:
+        if self.rows_written != self.height:
+            self.abort()
+            raise ValueError(f"Only {self.rows_written} of {self.height} rows were written")
+
+        self._pending += self._compressor.flush()
+        self._flush_idat(force=True)
+        self._write_chunk(b'IEND', b'')
+        self._file.close()
+        os.replace(self.path + '.part', self.path)
+        return self.path
+
+    def abort(self) -> None:
+        self._file.close()
+        try:
+            os.remove(self.path + '.part')
+        except OSError:
+            pass
+
+
+class BandedPNGReader:
+    """
+    Decode a non-interlaced 8-bit PNG band by band, top to bottom.
+
+    IDAT data is inflated incrementally and only the rows of the current band
+    are handed to Pillow, prefixed with the last row of the previous band so
+    every filter type still resolves. Reading the top of a tall capture, or a
+    collage band after band, never holds the whole bitmap.
+    """
+
+    CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+    def __init__(self, path: str):
+        self._file = open(path, 'rb')
+        try:
+            if self._file.read(8) != b'\x89PNG\r\n\x1a\n':
+                raise ValueError(f"{path} is not a PNG")
+
+            # Chunks before the first IDAT (IHDR, PLTE, tRNS, ...) are repeated in every band
+            self._header_chunks = []
+            while True:
+                tag, data = self._read_chunk()
+                if tag == b'IDAT':
+                    self._idat = data
+                    break
+                if tag == b'IEND':
+                    raise ValueError(f"{path} has no image data")
+                if tag == b'IHDR':
+                    self.width, self.height, bit_depth, colour_type, _, _, interlace = struct.unpack('>IIBBBBB', data)
+                    if bit_depth != 8 or interlace or colour_type not in self.CHANNELS:
+                        raise ValueError(f"{path} is not a non-interlaced 8-bit PNG")
+                    self._colour_type = colour_type
+                else:
+                    self._header_chunks.append((tag, data))
+        except BaseException:
+            self._file.close()
+            raise
+
+        self.row_bytes = self.width * self.CHANNELS[self._colour_type] + 1
+        self.rows_read = 0
+        self._decompressor = zlib.decompressobj()
+        self._raw = bytearray()
+        self._previous = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _read_chunk(self) -> tuple:
+        length, tag = struct.unpack('>I4s', self._file.read(8))
+        data = self._file.read(length)
+        self._file.read(4)  # CRC, Pillow checks the rebuilt chunks
+        return tag, data
+
+    def _fill(self, size: int) -> None:
+        while len(self._raw) < size:
+            if not self._idat:
+                tag, data = self._read_chunk()
+                if tag != b'IDAT':
+                    raise ValueError("PNG image data ended early")
+                self._idat = data
+            # Flat areas inflate a thousandfold, never inflate more than the band needs
+            self._raw += self._decompressor.decompress(self._idat, size - len(self._raw))
+            self._idat = self._decompressor.unconsumed_tail
+
+    @staticmethod
+    def _chunk(tag: bytes, data: bytes) -> bytes:
+        return (struct.pack('>I', len(data)) + tag + data +
+                struct.pack('>I', zlib.crc32(data, zlib.crc32(tag)) & 0xFFFFFFFF))
+
+    def read_band(self, height: int) -> Image.Image:
+        """Decode the next ``height`` rows, fewer at the bottom of the image"""
+        height = min(height, self.height - self.rows_read)
+        if height <= 0:
+            raise ValueError("No rows left to read")
+
+        size = height * self.row_bytes
+        self._fill(size)
+        rows = bytes(self._raw[:size])
+        del self._raw[:size]
+
+        # The previous row goes first unfiltered, the band's filters may refer to it
+        prefix = b'' if self._previous is None else b'\x00' + self._previous
+        band_height = height + (self._previous is not None)
+        ihdr = struct.pack('>IIBBBBB', self.width, band_height, 8, self._colour_type, 0, 0, 0)
+        png = b'\x89PNG\r\n\x1a\n' + self._chunk(b'IHDR', ihdr)
+        png += b''.join(self._chunk(tag, data) for tag, data in self._header_chunks)
+        png += self._chunk(b'IDAT', zlib.compress(prefix + rows, 1)) + self._chunk(b'IEND', b'')
+
+        with Image.open(io.BytesIO(png)) as image:
+            image.load()
+            if self._previous is not None:
+                image = image.crop((0, 1, self.width, band_height))
+            else:
+                image = image.copy()
+        self._previous = image.crop((0, height - 1, self.width, height)).tobytes()
+        self.rows_read += height
+        return image
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class FullPageStitcher:
+    """
+    Stream the viewport tiles of a tall page into a BandedPNGWriter.
+
+    Only the tile being added is decoded. Each tile is placed by the device
+    row its top was scrolled to, so the overlap left when the browser clamps
+    the last scroll position is cut off instead of repeated.
+    """
+
+    def __init__(self, path: str, width: int, height: int):
+        self.writer = BandedPNGWriter(path, width, height, compress_level=6)
+
+    def add(self, tile: Image.Image, top_row: int) -> None:
+        writer = self.writer
+        start = min(max(0, writer.rows_written - top_row), tile.height)
+        end = min(tile.height, start + writer.height - writer.rows_written)
+        if end <= start:
+            return
+
+        band = tile.crop((0, start, min(tile.width, writer.width), end))
+        if band.width != writer.width or band.mode != 'RGB':
+            padded = Image.new('RGB', (writer.width, band.height), 'white')
+            padded.paste(band.convert('RGB'), (0, 0))
+            band = padded
+        writer.write_band(band)
+
+    def add_png(self, png: bytes, top_row: int) -> None:
+        with Image.open(io.BytesIO(png)) as tile:
+            self.add(tile.convert('RGB'), top_row)
+
+    def close(self) -> str:
+        # Rounding of the page height can leave the last row or two uncovered
+        remaining = self.writer.height - self.writer.rows_written
+        if remaining > 0:
+            self.writer.write_band(Image.new('RGB', (self.writer.width, remaining), 'white'))
+        return self.writer.close()
+
+    def abort(self) -> None:
+        self.writer.abort()
@@ -0,0 +1,666 @@
+"""
+Asyncio capture backend that drives Chrome over the DevTools Protocol directly.
+
+One headless Chrome is started per run and every capture runs in its own
+target and browser context, multiplexed over a single websocket. Waiting for
+page loads happens on the event loop instead of in blocked worker threads, so
+many captures can be in flight at once.
+
+Requires the optional ``websockets`` package (``pip install websockets``).
+"""
+import asyncio
+import base64
+import hashlib
+import itertools
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from capture_core import (
+    BlankPageError,
+    Capture,
+    CaptureCache,
+    FullPageStitcher,
+    NetworkIdleTracker,
+    classify_failure,
+    retry_delay,
+)
+
+try:
+    import websockets
+except ImportError:  # Optional dependency, checked by is_available()
+    websockets = None
+
+CHROME_CANDIDATES = [
+    'google-chrome',
+    'google-chrome-stable',
+    'chromium',
+    'chromium-browser',
+    'chrome',
+    'C:/Program Files/Google/Chrome/Application/chrome.exe',
+    'C:/Program Files (x86)/Google/Chrome/Application/chrome.exe',
+    '/Applications/Google Chrome.app/Contents/MacOS/Google Chrome',
+]
+
+
+def find_chrome() -> Optional[str]:
+    """Locate a Chrome binary, honouring the CHROME_BINARY environment variable"""
+    candidates = [os.environ.get('CHROME_BINARY')] + CHROME_CANDIDATES
+    for candidate in candidates:
+        if not candidate:
+            continue
+        if os.path.isfile(candidate):
+            return candidate
+        found = shutil.which(candidate)
+        if found:
+            return found
+    return None
+
+
+def is_available() -> bool:
+    return websockets is not None and find_chrome() is not None
+
+
+class CDPError(Exception):
+    pass
+
+
+class ResponseCache(CaptureCache):
+    """
+    On-disk store of HTTP responses recorded through Fetch interception.
+
+    Every entry is one file holding a JSON line with the status and headers
+    followed by the raw body; eviction and the SQLite index are inherited
+    from CaptureCache.
+    """
+
+    suffix = '.response'
+    index_name = 'responses.sqlite3'
+
+    # The stored body is already decoded, these would describe the wire format
+    DROPPED_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding'}
+
+    @staticmethod
+    def response_key(method: str, url: str) -> str:
+        return hashlib.sha256(f"{method} {url}".encode('utf-8')).hexdigest()
+
+    def get_response(self, method: str, url: str) -> Optional[Dict]:
+        blob = self.get(self.response_key(method, url))
+        if blob is None:
+            return None
+        header, body = blob.split(b'\n', 1)
+        response = json.loads(header)
+        response['body'] = body
+        return response
+
+    def put_response(self, method: str, url: str, status: int, headers: List[Dict], body: bytes) -> None:
+        headers = [h for h in headers if h['name'].lower() not in self.DROPPED_HEADERS]
+        header = json.dumps({'status': status, 'headers': headers}).encode('utf-8')
+        self.put(self.response_key(method, url), header + b'\n' + body)
+
+
+class CDPConnection:
+    """Single browser websocket carrying commands for many flattened target sessions"""
+
+    def __init__(self, ws_url: str):
+        self.ws_url = ws_url
+        self._ws = None
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._listeners = []
+        self._reader = None
+
+    async def connect(self) -> None:
+        # Screenshots of 4K viewports easily exceed the default 1 MiB frame limit
+        self._ws = await websockets.connect(self.ws_url, max_size=None)
+        self._reader = asyncio.ensure_future(self._read_loop())
+
+    async def close(self) -> None:
+        if self._reader:
+            self._reader.cancel()
+        if self._ws:
+            await self._ws.close()
+
+    async def _read_loop(self) -> None:
+        try:
+            async for raw in self._ws:
+                message = json.loads(raw)
+                if 'id' in message:
+                    future = self._pending.pop(message['id'], None)
+                    if future and not future.done():
+                        if 'error' in message:
+                            future.set_exception(CDPError(message['error'].get('message', str(message['error']))))
+                        else:
+                            future.set_result(message.get('result', {}))
+                else:
+                    for listener in list(self._listeners):
+                        listener(message)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logging.error(f"DevTools connection lost: {str(e)}")
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(CDPError("DevTools connection closed"))
+            self._pending.clear()
+
+    async def send(self, method: str, params: Optional[Dict] = None, session_id: Optional[str] = None) -> Dict:
+        message_id = next(self._ids)
+        message = {'id': message_id, 'method': method, 'params': params or {}}
+        if session_id:
+            message['sessionId'] = session_id
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[message_id] = future
+        await self._ws.send(json.dumps(message))
+        return await future
+
+    def add_listener(self, listener: Callable[[Dict], None]) -> None:
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[Dict], None]) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def wait_for_event(self, method: str, session_id: Optional[str] = None) -> asyncio.Future:
+        """Return a future resolved by the next matching event; register it before triggering the event"""
+        future = asyncio.get_running_loop().create_future()
+
+        def listener(message):
+            if message.get('method') == method and message.get('sessionId') == session_id:
+                if not future.done():
+                    future.set_result(message.get('params', {}))
+                self._listeners.remove(listener)
+
+        self._listeners.append(listener)
+        future.add_done_callback(lambda _: listener in self._listeners and self._listeners.remove(listener))
+        return future
+
+
+@dataclass
+class CDPPage:
+    """Target of one capture, kept across retries so a blank page is re-waited without reloading"""
+    connection: CDPConnection
+    context_id: str
+    target_id: Optional[str] = None
+    session_id: Optional[str] = None
+    network: NetworkIdleTracker = field(default_factory=NetworkIdleTracker)
+    listeners: List[Callable[[Dict], None]] = field(default_factory=list)
+
+
+class AsyncCaptureEngine:
+    """Capture viewports through one Chrome process using asyncio and raw CDP"""
+
+    def __init__(self, screenshotter, max_in_flight: int = 16, retry_count: int = 3):
+        self.screenshotter = screenshotter
+        self.max_in_flight = max_in_flight
+        self.retry_count = retry_count
+
+        self.process = None
+        self.connection = None
+        self.user_data_dir = None
+
+        # Bumped by every restart so tasks that saw the same crash restart Chrome once
+        self.generation = 0
+        self._restart_lock = asyncio.Lock()
+
+        # 'shared' serves subresources from disk and records everything, 'replay' never touches the network
+        self.http_cache_mode = screenshotter.http_cache
+        self.response_cache = None
+
+    def open_response_cache(self) -> None:
+        """
+        Responses are stored without their freshness rules, so 'shared' only
+        reuses them within one run and starts by dropping the previous
+        recording. The recording stays on disk afterwards for 'replay' runs.
+        """
+        self.response_cache = ResponseCache(self.screenshotter.http_cache_dir, self.screenshotter.http_cache_max_bytes)
+        if self.http_cache_mode == 'shared':
+            # Only the cache's own entries, the directory may hold anything else
+            self.response_cache.clear()
+
+    async def start(self) -> None:
+        chrome = find_chrome()
+        if chrome is None:
+            raise CDPError("Chrome binary not found, set CHROME_BINARY")
+
+        if self.http_cache_mode != 'off' and self.response_cache is None:
+            self.open_response_cache()
+
+        with self.screenshotter.timings.measure('driver_start'):
+            self.user_data_dir = tempfile.mkdtemp(prefix='cdp-capture-')
+            args = [chrome] + self.screenshotter.get_chrome_options().arguments + [
+                '--remote-debugging-port=0',
+                f'--user-data-dir={self.user_data_dir}',
+                'about:blank',
+            ]
+            self.process = subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+            # Chrome writes the chosen port and browser endpoint once it is listening
+            port_file = os.path.join(self.user_data_dir, 'DevToolsActivePort')
+            deadline = time.monotonic() + 30
+            while True:
+                if os.path.exists(port_file):
+                    with open(port_file) as f:
+                        lines = f.read().splitlines()
+                    if len(lines) >= 2:
+                        break
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    raise CDPError("Chrome did not expose a DevTools endpoint")
+                await asyncio.sleep(0.1)
+
+            self.connection = CDPConnection(f"ws://127.0.0.1:{lines[0]}{lines[1]}")
+            await self.connection.connect()
+
+    async def stop_browser(self, kill: bool = False) -> None:
+        """Close Chrome and its websocket, a crashed browser is killed without asking it to close"""
+        if self.connection:
+            if not kill:
+                try:
+                    await self.connection.send('Browser.close')
+                except Exception:
+                    pass
+            try:
+                await self.connection.close()
+            except Exception:
+                pass
+        if self.process:
+            if kill:
+                self.process.kill()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        if self.user_data_dir:
+            shutil.rmtree(self.user_data_dir, ignore_errors=True)
+            self.user_data_dir = None
+
+    def busy_pids(self) -> List[int]:
+        return [self.process.pid] if self.process else []
+
+    async def restart(self, generation: int) -> None:
+        """Replace Chrome after a crash, unless another task already did since ``generation``"""
+        async with self._restart_lock:
+            if generation != self.generation:
+                return
+            logging.warning("Restarting Chrome after a crash")
+            await self.stop_browser(kill=True)
+            # The response cache stays open, start() only opens a missing one
+            await self.start()
+            self.generation += 1
+
+    async def stop(self) -> None:
+        await self.stop_browser()
+        if self.response_cache:
+            self.response_cache.close()
+            self.response_cache = None
+
+    async def enable_response_cache(self, session_id: str) -> Callable[[Dict], None]:
+        """Pause every request of the session at request and response stage; returns the listener to remove"""
+        pending = set()
+
+        def on_request_paused(message):
+            if message.get('method') == 'Fetch.requestPaused' and message.get('sessionId') == session_id:
+                task = asyncio.ensure_future(self.handle_paused_request(session_id, message['params']))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+
+        self.connection.add_listener(on_request_paused)
+        await self.connection.send('Fetch.enable', {'patterns': [
+            {'urlPattern': '*', 'requestStage': 'Request'},
+            {'urlPattern': '*', 'requestStage': 'Response'},
+        ]}, session_id)
+        return on_request_paused
+
+    async def handle_paused_request(self, session_id: str, params: Dict) -> None:
+        """Answer one Fetch.requestPaused event from the cache, or record the network response"""
+        send = self.connection.send
+        loop = asyncio.get_running_loop()
+        request_id = params['requestId']
+        request = params['request']
+        cacheable = request['method'] == 'GET' and not request['url'].startswith('data:')
+
+        try:
+            if 'responseStatusCode' not in params and 'responseErrorReason' not in params:
+                # Request stage. Documents are always fetched fresh unless replaying
+                if cacheable and (self.http_cache_mode == 'replay' or params.get('resourceType') != 'Document'):
+                    cached = await loop.run_in_executor(None, self.response_cache.get_response, 'GET', request['url'])
+                    if cached:
+                        await send('Fetch.fulfillRequest', {
+                            'requestId': request_id,
+                            'responseCode': cached['status'],
+                            'responseHeaders': cached['headers'],
+                            'body': base64.b64encode(cached['body']).decode('ascii'),
+                        }, session_id)
+                        return
+
+                if self.http_cache_mode == 'replay':
+                    await send('Fetch.failRequest', {'requestId': request_id, 'errorReason': 'InternetDisconnected'}, session_id)
+                    return
+                await send('Fetch.continueRequest', {'requestId': request_id}, session_id)
+                return
+
+            # Response stage, only complete 200 responses are worth keeping
+            if not cacheable or params.get('responseStatusCode') != 200:
+                await send('Fetch.continueRequest', {'requestId': request_id}, session_id)
+                return
+
+            result = await send('Fetch.getResponseBody', {'requestId': request_id}, session_id)
+            body = base64.b64decode(result['body']) if result.get('base64Encoded') else result['body'].encode('utf-8')
+            headers = params.get('responseHeaders', [])
+            await loop.run_in_executor(
+                None, self.response_cache.put_response, 'GET', request['url'], 200, headers, body
+            )
+            await send('Fetch.fulfillRequest', {
+                'requestId': request_id,
+                'responseCode': 200,
+                'responseHeaders': [h for h in headers if h['name'].lower() not in ResponseCache.DROPPED_HEADERS],
+                'body': base64.b64encode(body).decode('ascii'),
+            }, session_id)
+
+        except Exception as e:
+            # A paused request that is never answered would stall the page
+            logging.debug(f"Response cache skipped {request['url']}: {str(e)}")
+            try:
+                await send('Fetch.continueRequest', {'requestId': request_id}, session_id)
+            except Exception:
+                pass
+
+    async def evaluate(self, session_id: str, script: str, *args) -> Dict:
+        """Run one of the screenshotter page scripts, awaiting a returned promise"""
+        result = await self.connection.send('Runtime.evaluate', {
+            'expression': f"(function() {{{script}}}).apply(null, {json.dumps(list(args))})",
+            'awaitPromise': True,
+            'returnByValue': True,
+        }, session_id)
+        if 'exceptionDetails' in result:
+            raise CDPError(f"Script error: {result['exceptionDetails'].get('text', 'unknown')}")
+        return result.get('result', {})
+
+    async def wait_until_ready(self, session_id: str, network: NetworkIdleTracker) -> Dict:
+        """Async counterpart of WebsiteScreenshotter.wait_until_ready"""
+        quiet_period = self.screenshotter.quiet_period
+        deadline = time.monotonic() + self.screenshotter.readiness_timeout
+
+        network_idle = False
+        while time.monotonic() < deadline:
+            if network.is_idle(quiet_period):
+                network_idle = True
+                break
+            await asyncio.sleep(0.1)
+
+        remaining_ms = max(0, int((deadline - time.monotonic()) * 1000))
+        result = await self.evaluate(
+            session_id, self.screenshotter.READINESS_SCRIPT, int(quiet_period * 1000), remaining_ms
+        )
+        signals = result.get('value') or {}
+        signals['network'] = network_idle
+        return signals
+
+    async def open_page(self, viewport) -> CDPPage:
+        """Create an isolated target emulating the viewport, with request tracking and the response cache"""
+        # Tasks still running on a crashed browser keep their own connection across a restart
+        connection = self.connection
+        send = connection.send
+        content_width, content_height = self.screenshotter.get_content_size(viewport)
+
+        context = await send('Target.createBrowserContext')
+        page = CDPPage(connection, context['browserContextId'])
+        try:
+            target = await send('Target.createTarget', {'url': 'about:blank', 'browserContextId': page.context_id})
+            page.target_id = target['targetId']
+            session = await send('Target.attachToTarget', {'targetId': page.target_id, 'flatten': True})
+            page.session_id = session_id = session['sessionId']
+
+            await send('Page.enable', {}, session_id)
+            await send('Network.enable', {}, session_id)
+            if self.screenshotter.blocked_urls:
+                await send('Network.setBlockedURLs', {'urls': self.screenshotter.blocked_urls}, session_id)
+            await send('Emulation.setDeviceMetricsOverride', {
+                'width': content_width,
+                'height': content_height,
+                'deviceScaleFactor': viewport.dpr,
+                'mobile': self.screenshotter.is_mobile(viewport),
+                'screenOrientation': {
+                    'type': 'portraitPrimary',
+                    'angle': 0
+                }
+            }, session_id)
+            await send('Emulation.setUserAgentOverride', {'userAgent': viewport.user_agent}, session_id)
+            await send('Emulation.setScrollbarsHidden', {'hidden': True}, session_id)
+
+            if self.response_cache:
+                page.listeners.append(await self.enable_response_cache(session_id))
+
+            def on_network_event(message):
+                if message.get('sessionId') == session_id:
+                    # Looked up per event, a reload replaces the tracker
+                    page.network.handle_event(message.get('method', ''), message.get('params', {}))
+
+            connection.add_listener(on_network_event)
+            page.listeners.append(on_network_event)
+        except BaseException:
+            await self.close_page(page)
+            raise
+        return page
+
+    async def close_page(self, page: CDPPage) -> None:
+        for listener in page.listeners:
+            page.connection.remove_listener(listener)
+        try:
+            if page.target_id:
+                await page.connection.send('Target.closeTarget', {'targetId': page.target_id})
+            await page.connection.send('Target.disposeBrowserContext', {'browserContextId': page.context_id})
+        except Exception:
+            pass
+
+    async def load_and_capture(self, page: CDPPage, url: str, viewport, attempt: int) -> Capture:
+        """Navigate the page to the url and return the decoded screenshot once it settled"""
+        send = page.connection.send
+        session_id = page.session_id
+        timings = self.screenshotter.timings
+        page.network = NetworkIdleTracker()
+
+        with timings.measure('navigation', viewport.name, attempt):
+            load_event = page.connection.wait_for_event('Page.loadEventFired', session_id)
+            navigation = await send('Page.navigate', {'url': url}, session_id)
+            if navigation.get('errorText'):
+                load_event.cancel()
+                raise CDPError(f"Navigation failed: {navigation['errorText']}")
+            await asyncio.wait_for(load_event, 30)
+
+        with timings.measure('page_load', viewport.name, attempt):
+            await self.evaluate(session_id, self.screenshotter.PAGE_LOAD_SCRIPT)
+        if self.screenshotter.capture_mode.hydration:
+            with timings.measure('hydration', viewport.name, attempt):
+                await self.evaluate(session_id, self.screenshotter.HYDRATION_SCRIPT)
+        if self.screenshotter.capture_mode.full_page:
+            with timings.measure('lazy_load', viewport.name, attempt):
+                await self.evaluate(
+                    session_id, self.screenshotter.LAZY_LOAD_SCRIPT, self.screenshotter.FULL_PAGE_MAX_HEIGHT
+                )
+        return await self.recapture_loaded_page(page, viewport, attempt)
+
+    async def recapture_loaded_page(self, page: CDPPage, viewport, attempt: int) -> Capture:
+        """Capture the already loaded page again after another readiness wait, without navigating"""
+        timings = self.screenshotter.timings
+        with timings.measure('readiness', viewport.name, attempt):
+            await self.wait_until_ready(page.session_id, page.network)
+
+        if self.screenshotter.capture_mode.full_page:
+            return await self.capture_full_page(page.session_id, viewport, attempt)
+
+        with timings.measure('capture', viewport.name, attempt):
+            screenshot = await page.connection.send('Page.captureScreenshot', {'format': 'png'}, page.session_id)
+            png = base64.b64decode(screenshot['data'])
+        with timings.measure('decode', viewport.name, attempt):
+            return await asyncio.get_running_loop().run_in_executor(None, self.screenshotter.decode_capture, png)
+
+    async def capture_full_page(self, session_id: str, viewport, attempt: int) -> Capture:
+        """
+        Async counterpart of WebsiteScreenshotter.capture_full_page. While one
+        tile is decoded and compressed in an executor the next one is captured,
+        so at most two tiles are held in memory.
+        """
+        send = self.connection.send
+        loop = asyncio.get_running_loop()
+        screenshotter = self.screenshotter
+        timings = screenshotter.timings
+
+        layout_metrics = await send('Page.getLayoutMetrics', {}, session_id)
+        height, device_height, offsets = screenshotter.plan_full_page(viewport, layout_metrics)
+
+        if offsets is None:
+            with timings.measure('capture', viewport.name, attempt):
+                screenshot = await send(
+                    'Page.captureScreenshot', screenshotter.full_page_screenshot_params(viewport, height), session_id
+                )
+                png = base64.b64decode(screenshot['data'])
+            with timings.measure('decode', viewport.name, attempt):
+                return await loop.run_in_executor(None, screenshotter.decode_full_page, png, viewport)
+
+        async def capture_tile(offset: int) -> tuple:
+            scroll = await self.evaluate(session_id, screenshotter.TILE_SCROLL_SCRIPT, offset)
+            screenshot = await send('Page.captureScreenshot', {'format': 'png'}, session_id)
+            return scroll.get('value', offset), base64.b64decode(screenshot['data'])
+
+        with timings.measure('capture', viewport.name, attempt):
+            _, png = await capture_tile(0)
+        with timings.measure('decode', viewport.name, attempt):
+            first = await loop.run_in_executor(None, screenshotter.decode_capture, png)
+
+        # A blank page is not worth stitching, the content check in capture_screenshot rejects it
+        if not await loop.run_in_executor(None, screenshotter.check_screenshot_content, first.image):
+            return first
+
+        path = screenshotter.full_page_spool_path()
+        stitcher = FullPageStitcher(path, first.image.width, device_height)
+        pending = None
+        try:
+            with timings.measure('stitch', viewport.name, attempt):
+                pending = loop.run_in_executor(None, stitcher.add, first.image, 0)
+                for offset in offsets[1:]:
+                    scroll_y, png = await capture_tile(offset)
+                    await pending
+                    pending = loop.run_in_executor(None, stitcher.add_png, png, round(scroll_y * viewport.dpr))
+                await pending
+                pending = None
+                await loop.run_in_executor(None, stitcher.close)
+        except BaseException:
+            if pending is not None:
+                # The writer must not be closed under a running band
+                await asyncio.gather(pending, return_exceptions=True)
+            stitcher.abort()
+            raise
+
+        return Capture(first.png, first.image, path)
+
+    async def admit(self, pixels: int) -> None:
+        """Wait for the screenshotter's governor without blocking an executor thread"""
+        governor = self.screenshotter.governor
+        while not governor.try_acquire(pixels):
+            await asyncio.sleep(governor.poll_interval)
+
+    async def capture_screenshot(self, url: str, viewport, semaphore: asyncio.Semaphore) -> Optional[Dict]:
+        loop = asyncio.get_running_loop()
+        pixels = self.screenshotter.governor.pixel_cost(viewport)
+        async with semaphore:
+            # Fingerprinting does blocking HTTP requests
+            cached = await loop.run_in_executor(None, self.screenshotter.load_cached_capture, url, viewport)
+            if cached:
+                return cached
+
+            failures = {}
+            page = None
+            reload = True
+            try:
+                for attempt in range(self.retry_count):
+                    await self.admit(pixels)
+                    generation = self.generation
+                    try:
+                        try:
+                            if page is None:
+                                page = await self.open_page(viewport)
+                                reload = True
+                            if reload:
+                                capture = await self.load_and_capture(page, url, viewport, attempt)
+                            else:
+                                capture = await self.recapture_loaded_page(page, viewport, attempt)
+                        finally:
+                            self.screenshotter.governor.release(pixels)
+
+                        # Image analysis is CPU bound, keep it off the event loop
+                        with self.screenshotter.timings.measure('content_check', viewport.name, attempt):
+                            has_content = await loop.run_in_executor(
+                                None, self.screenshotter.check_screenshot_content, capture.image
+                            )
+                        if not has_content:
+                            raise BlankPageError(f"Empty or blank screen detected for {viewport.name}")
+
+                        return await loop.run_in_executor(
+                            None, self.screenshotter.save_capture, capture, viewport, None, url
+                        )
+
+                    except Exception as e:
+                        failure = classify_failure(e)
+                        failures[failure] = failures.get(failure, 0) + 1
+                        logging.warning(f"Attempt {attempt + 1} failed for {viewport.name} ({failure}): {str(e)}")
+                        if attempt == self.retry_count - 1:
+                            logging.error(f"Failed to capture {viewport.name} after {self.retry_count} attempts")
+                            return None
+
+                        if page is not None and failure != 'blank':
+                            # Timeouts and errors load again in a fresh target
+                            await self.close_page(page)
+                            page = None
+                        if failure == 'crash':
+                            # A fresh target is useless once Chrome or its websocket is gone
+                            try:
+                                await self.restart(generation)
+                            except Exception as restart_error:
+                                logging.error(f"Chrome restart failed: {str(restart_error)}")
+
+                        # A blank page keeps its load and only waits longer, twice in a row reloads it
+                        reload = not (failure == 'blank' and failures['blank'] % 2 == 1)
+                        await asyncio.sleep(retry_delay(failure, failures[failure]))
+            finally:
+                if page is not None:
+                    await self.close_page(page)
+
+    async def capture_all(self, url: str, viewports: List, collages=None) -> List[Dict]:
+        """Capture the viewports concurrently, reporting each result to the optional CollageScheduler"""
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        screenshots = []
+
+        # Tasks start in the given order, results are taken as they finish
+        tasks = {
+            asyncio.ensure_future(self.capture_screenshot(url, viewport, semaphore)): viewport
+            for viewport in viewports
+        }
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                viewport = tasks[task]
+                screenshot = None
+                try:
+                    screenshot = task.result()
+                    if screenshot:
+                        screenshots.append(screenshot)
+                        logging.info(f"Captured {viewport.name}")
+                except Exception as e:
+                    logging.error(f"Error processing {viewport.name}: {str(e)}")
+                if collages is not None:
+                    # Without collage workers the scheduler renders inline, keep that off the event loop
+                    await loop.run_in_executor(None, collages.add, viewport.name, screenshot)
+
+        return screenshots
@@ -4,14 +4,20 @@ from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.by import By
-from PIL import Image, ImageDraw, ImageFont, ImageSequence, ImageFilter
+from PIL import GifImagePlugin, Image, ImageDraw, ImageFont, ImageSequence, ImageFilter
 import logging
 import os
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Union
 from dataclasses import dataclass
 import time
 from selenium.common.exceptions import WebDriverException
 import io
+import math
+import queue
+import numpy as np
+
+from capture_core import classify_failure, retry_delay
+from responsive_website_screenshotter import ResourceGovernor, StageTimer, analyze_content, blocked_url_patterns
 
 
 @dataclass
@@ -23,6 +29,119 @@ class Viewport:
     user_agent: str
 
 
+class FrameDiffGIFEncoder:
+    """
+    Animated GIF writer that only stores what changed between frames.
+
+    Every frame is mapped onto one global palette of 255 colours, index 255
+    is transparent. After the first frame only the bounding box of changed
+    pixels is written, unchanged pixels inside it are transparent and the
+    frame is drawn over the previous one (disposal 1). A frame identical to
+    the previous one extends its duration instead of being written.
+    """
+
+    TRANSPARENT = 255
+
+    def __init__(self, path: str, palette: Image.Image, duration: int = 500, loop: int = 0):
+        self.path = path
+        self.duration = duration
+        self.loop = loop
+        self.frames = 0
+
+        # Unused slots repeat colour 0 so they are never the only nearest match
+        colours = palette.getpalette()[:3 * self.TRANSPARENT]
+        self.colour_count = len(colours) // 3
+        self.palette_bytes = bytes(colours + colours[:3] * (256 - self.colour_count))
+        self.palette = Image.new('P', (1, 1))
+        self.palette.putpalette(self.palette_bytes)
+
+        self.size = None
+        self._previous = None
+        self._pending = None
+        self._file = open(path + '.part', 'wb')
+
+    @classmethod
+    def build_palette(cls, images: List[Image.Image], max_pixels: int = 1_000_000) -> Image.Image:
+        """Quantize a downscaled sample of all frames at once into one palette"""
+        scale = min(1.0, math.sqrt(max_pixels / sum(image.width * image.height for image in images)))
+        samples = [
+            image.resize((max(1, int(image.width * scale)), max(1, int(image.height * scale))), Image.Resampling.NEAREST)
+            for image in images
+        ]
+        strip = Image.new('RGB', (max(sample.width for sample in samples), sum(sample.height for sample in samples)))
+        y = 0
+        for sample in samples:
+            strip.paste(sample, (0, y))
+            y += sample.height
+        return strip.quantize(cls.TRANSPARENT, method=Image.Quantize.MEDIANCUT)
+
+    def quantize(self, image: Image.Image) -> np.ndarray:
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        if self.size and image.size != self.size:
+            image = image.resize(self.size, Image.Resampling.LANCZOS)
+        indices = np.array(image.quantize(palette=self.palette, dither=Image.Dither.NONE))
+        indices[indices >= self.colour_count] = 0
+        return indices
+
+    def add_frame(self, image: Image.Image, duration: Optional[int] = None) -> None:
+        duration = self.duration if duration is None else duration
+        indices = self.quantize(image)
+
+        if self._previous is None:
+            self.size = image.size
+            header, _ = GifImagePlugin.getheader(self.palette.resize(self.size), None, {'loop': self.loop})
+            self._file.write(b''.join(header))
+            region, offset = indices, (0, 0)
+        else:
+            changed = indices != self._previous
+            if not changed.any():
+                self._pending[2] += duration
+                return
+
+            rows = np.flatnonzero(changed.any(axis=1))
+            cols = np.flatnonzero(changed.any(axis=0))
+            top, bottom, left, right = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+            region = indices[top:bottom, left:right].copy()
+            region[~changed[top:bottom, left:right]] = self.TRANSPARENT
+            offset = (int(left), int(top))
+
+        self._write_pending()
+        self._pending = [region, offset, duration]
+        self._previous = indices
+        self.frames += 1
+
+    def _write_pending(self) -> None:
+        if self._pending is None:
+            return
+        region, offset, duration = self._pending
+        frame = Image.fromarray(region, 'P')
+        frame.putpalette(self.palette_bytes)
+        for chunk in GifImagePlugin.getdata(
+                frame, offset, duration=duration, disposal=1, transparency=self.TRANSPARENT
+        ):
+            self._file.write(chunk)
+        self._pending = None
+
+    def close(self) -> Optional[str]:
+        """Finish the file; None when no frame was added"""
+        if self._previous is None:
+            self.abort()
+            return None
+        self._write_pending()
+        self._file.write(b';')
+        self._file.close()
+        os.replace(self.path + '.part', self.path)
+        return self.path
+
+    def abort(self) -> None:
+        self._file.close()
+        try:
+            os.remove(self.path + '.part')
+        except OSError:
+            pass
+
+
 class WebsiteScreenshotter:
     VIEWPORTS = [
         # Presentation & Portfolio Displays
@@ -107,11 +226,23 @@ class WebsiteScreenshotter:
                  "Mozilla/5.0 (Linux; Android 14; CPH2573) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Mobile Safari/537.36")
     ]
 
-    def __init__(self, output_dir: str, max_workers: int = 3):
+    def __init__(self, output_dir: str, max_workers: int = 3, blocking_profile: str = 'none',
+                 gif_max_width: Optional[int] = 1280, frame_queue_size: int = 4):
         self.output_dir = output_dir
         self.max_workers = max_workers
+        self.blocked_urls = blocked_url_patterns(blocking_profile)
+
+        # Frames are encoded while capture continues; only frame_queue_size PNGs wait at any time
+        self.gif_max_width = gif_max_width
+        self.frame_queue_size = frame_queue_size
         self.setup_logging()
 
+        # max_workers is an upper bound, every capture starts its own Chrome
+        self.governor = ResourceGovernor(max_workers)
+
+        # Per-viewport durations of capture, queue and encode stages of the last run
+        self.timings = StageTimer()
+
         # Create output directory if it doesn't exist
         os.makedirs(output_dir, exist_ok=True)
 
@@ -208,16 +339,21 @@ class WebsiteScreenshotter:
             self,
             driver: webdriver.Chrome,
             viewport: Viewport,
+            frames: queue.Queue,
             frame_count: int = 15,  # 15 кадров
-            delay: float = 0.2  # 0.2 секунды между кадрами
-    ) -> List[bytes]:
-        """Capture multiple frames for GIF creation"""
-        frames = []
+            delay: float = 0.2,  # 0.2 секунды между кадрами
+            attempt: int = 0
+    ) -> int:
+        """Capture frames into the queue, ending with None; returns the number captured"""
+        captured = 0
         try:
             for _ in range(frame_count):
-                # Capture screenshot as bytes
-                screenshot_bytes = driver.get_screenshot_as_png()
-                frames.append(screenshot_bytes)
+                with self.timings.measure('capture', viewport.name, attempt):
+                    png = driver.get_screenshot_as_png()
+                # Blocks while the encoder is behind, so at most a few PNGs are in memory
+                with self.timings.measure('queue_wait', viewport.name, attempt):
+                    frames.put(png)
+                captured += 1
 
                 # Scroll slightly and wait
                 driver.execute_script("""
@@ -228,33 +364,88 @@ class WebsiteScreenshotter:
                 """)
                 time.sleep(delay)
 
-            return frames
-
         except Exception as e:
             logging.error(f"Error capturing frames: {str(e)}")
-            return []
 
-    def create_gif_from_frames(self, frames: List[bytes], output_path: str, duration: int = 500) -> Optional[str]:
-        """Convert captured frames to GIF"""
+        finally:
+            frames.put(None)
+
+        return captured
+
+    def decode_frame(self, png: bytes) -> Image.Image:
+        """Decode one captured frame and downscale it to the GIF width"""
+        with Image.open(io.BytesIO(png)) as img:
+            img = img.convert('RGB')
+        if self.gif_max_width and img.width > self.gif_max_width:
+            height = max(1, round(img.height * self.gif_max_width / img.width))
+            img = img.resize((self.gif_max_width, height), Image.Resampling.LANCZOS, reducing_gap=2.0)
+        return img
+
+    def create_gif_from_frames(self, frames: queue.Queue, output_path: str, duration: int = 500,
+                               palette_frames: int = 2, viewport_name: Optional[str] = None,
+                               attempt: Optional[int] = None) -> Optional[str]:
+        """
+        Encode frames from the queue as they arrive, dropping blank frames,
+        until None is received. The palette is built from the first
+        palette_frames usable frames, later frames are mapped onto it.
+        """
+        encoder = None
+        buffered = []
+        png = b''
+        measure = lambda stage: self.timings.measure(stage, viewport_name, attempt)
+
+        def start_encoder(images: List[Image.Image]) -> FrameDiffGIFEncoder:
+            started = FrameDiffGIFEncoder(output_path, FrameDiffGIFEncoder.build_palette(images), duration)
+            try:
+                for image in images:
+                    started.add_frame(image)
+            except Exception:
+                started.abort()
+                raise
+            return started
+
         try:
-            images = []
-            for frame in frames:
-                img = Image.open(io.BytesIO(frame))
-                images.append(img.convert('RGB'))
-
-            if images:
-                images[0].save(
-                    output_path,
-                    save_all=True,
-                    append_images=images[1:],
-                    duration=duration,
-                    loop=0,
-                    optimize=True
-                )
-                return output_path
-            return None
+            index = -1
+            while True:
+                png = frames.get()
+                if png is None:
+                    break
+                index += 1
+
+                with measure('decode'):
+                    img = self.decode_frame(png)
+                with measure('content_check'):
+                    has_content = self.check_screenshot_content(img)
+                if not has_content:
+                    logging.debug(f"Skipping blank frame {index}")
+                    continue
+
+                if encoder is not None:
+                    with measure('encode'):
+                        encoder.add_frame(img)
+                    continue
+
+                buffered.append(img)
+                if len(buffered) == palette_frames:
+                    with measure('encode'):
+                        encoder = start_encoder(buffered)
+                    buffered = []
+
+            with measure('encode'):
+                # Fewer usable frames than palette_frames
+                if encoder is None and buffered:
+                    encoder = start_encoder(buffered)
+
+                return encoder.close() if encoder else None
+
         except Exception as e:
             logging.error(f"Error creating GIF: {str(e)}")
+            if encoder:
+                encoder.abort()
+
+            # Drain the queue so the capturing side never blocks on it
+            while png is not None:
+                png = frames.get()
             return None
 
     def verify_page_content(self, driver: webdriver.Chrome) -> bool:
@@ -277,63 +468,25 @@ class WebsiteScreenshotter:
         except:
             return False
 
-    def check_screenshot_content(self, image_path: str) -> bool:
-        """Check if the screenshot has real content"""
-        with Image.open(image_path) as img:
-            # Convert to RGB if in different format
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-
-            # Resize for faster analysis
-            thumb = img.resize((100, 100))
-
-            pixels = thumb.getcolors(10000)
-            if not pixels:
-                return False
-
-            total_pixels = sum(count for count, _ in pixels)
-
-            # Check for white and near-white pixels
-            white_pixels = sum(
-                count for count, color in pixels
-                if all(c > 250 for c in color)
-            )
-
-            # Check for very light pixels
-            very_light_pixels = sum(
-                count for count, color in pixels
-                if all(c > 240 for c in color)
-            )
-
-            # Check for dark pixels (text, borders etc.)
-            dark_pixels = sum(
-                count for count, color in pixels
-                if any(c < 200 for c in color)
-            )
-
-            # Calculate ratios
-            white_ratio = white_pixels / total_pixels
-            very_light_ratio = very_light_pixels / total_pixels
-            dark_ratio = dark_pixels / total_pixels
-
-            # Content checks
-            if white_ratio > 0.98:
-                return False
-            if very_light_ratio > 0.95 and dark_ratio < 0.01:
-                return False
-            if dark_ratio > 0.02:
-                return True
-
-            return True
+    def check_screenshot_content(self, image: Union[str, Image.Image]) -> bool:
+        """Check if the screenshot or GIF frame has real content"""
+        if isinstance(image, str):
+            with Image.open(image) as img:
+                return analyze_content(img.convert('RGB')).has_content()
+        return analyze_content(image).has_content()
 
     def capture_screenshot(self, url: str, viewport: Viewport, retry_count: int = 3) -> Dict:
         """Modified to capture GIF instead of static screenshot"""
+        pixels = self.governor.pixel_cost(viewport)
+        failures = {}
         for attempt in range(retry_count):
             driver = None
+            self.governor.acquire(pixels)
             try:
                 options = self.get_chrome_options()
                 options.add_argument(f'user-agent={viewport.user_agent}')
-                driver = webdriver.Chrome(options=options)
+                with self.timings.measure('driver_start', viewport.name, attempt):
+                    driver = webdriver.Chrome(options=options)
 
                 # Setup viewport and load page
                 physical_width = int(viewport.width / viewport.dpr)
@@ -347,23 +500,37 @@ class WebsiteScreenshotter:
                     'mobile': 'mobile' in viewport.name.lower() or 'iphone' in viewport.name.lower()
                 })
 
-                driver.get(url)
-                self.wait_for_page_load(driver, viewport)
-                self.inject_hydration_handling(driver)
-
-                # Capture frames for GIF
-                frames = self.capture_gif_frames(driver, viewport)
+                if self.blocked_urls:
+                    driver.execute_cdp_cmd('Network.enable', {})
+                    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': self.blocked_urls})
 
-                if not frames:
-                    raise WebDriverException("No frames captured")
+                with self.timings.measure('navigation', viewport.name, attempt):
+                    driver.get(url)
+                with self.timings.measure('page_load', viewport.name, attempt):
+                    self.wait_for_page_load(driver, viewport)
+                with self.timings.measure('hydration', viewport.name, attempt):
+                    self.inject_hydration_handling(driver)
 
-                # Create GIF
                 gif_path = os.path.join(
                     self.output_dir,
                     f"screenshot-{viewport.name}.gif"
                 )
 
-                if self.create_gif_from_frames(frames, gif_path):
+                # Capture frames for GIF while a second thread encodes them
+                frames = queue.Queue(maxsize=self.frame_queue_size)
+                with ThreadPoolExecutor(max_workers=1) as encoding:
+                    encoded = encoding.submit(
+                        self.create_gif_from_frames, frames, gif_path, viewport_name=viewport.name, attempt=attempt
+                    )
+                    captured = self.capture_gif_frames(driver, viewport, frames, attempt=attempt)
+                    # Encoding that is still running once the last frame is queued
+                    with self.timings.measure('encode_tail', viewport.name, attempt):
+                        gif = encoded.result()
+
+                if not captured:
+                    raise WebDriverException("No frames captured")
+
+                if gif:
                     return {
                         "name": viewport.name,
                         "path": gif_path,
@@ -375,14 +542,16 @@ class WebsiteScreenshotter:
                         "user_agent": viewport.user_agent
                     }
 
-                return None
+                raise WebDriverException(f"No usable frames for {viewport.name}")
 
             except Exception as e:
-                logging.warning(f"Attempt {attempt + 1} failed for {viewport.name}: {str(e)}")
+                failure = classify_failure(e)
+                failures[failure] = failures.get(failure, 0) + 1
+                logging.warning(f"Attempt {attempt + 1} failed for {viewport.name} ({failure}): {str(e)}")
                 if attempt == retry_count - 1:
                     logging.error(f"Failed to capture {viewport.name} after {retry_count} attempts")
                     return None
-                time.sleep(3)
+                time.sleep(retry_delay(failure, failures[failure]))
 
             finally:
                 if driver:
@@ -390,6 +559,7 @@ class WebsiteScreenshotter:
                         driver.quit()
                     except:
                         pass
+                self.governor.release(pixels)
 
     def create_category_collages(self, screenshots: List[Dict]) -> None:
         try:
@@ -713,6 +883,7 @@ class WebsiteScreenshotter:
 
     def process_website(self, url: str) -> None:
         logging.info(f"Starting capture for: {url}")
+        self.timings.reset()
 
         with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
             future_to_viewport = {
@@ -732,7 +903,8 @@ class WebsiteScreenshotter:
                     logging.error(f"Error processing {viewport.name}: {str(e)}")
 
             if screenshots:
-                self.create_category_collages(screenshots)
+                with self.timings.measure('collage'):
+                    self.create_category_collages(screenshots)
                 logging.info("Process completed successfully")
             else:
                 logging.error("No screenshots were captured successfully")
@@ -741,11 +913,15 @@ class WebsiteScreenshotter:
 def main():
     OUTPUT_DIR = r"C:\Users\user\Downloads\testScript"  # Change this to your desired output directory
     URL = "http://127.0.0.1:5000/login"  # Change this to your target URL
-    MAX_WORKERS = 1  # Adjust based on your system's capabilities
+    MAX_WORKERS = 4  # Upper bound, fewer run at once under memory or CPU pressure
+    BLOCKING_PROFILE = 'none'  # 'privacy', 'lean' or 'fast' block trackers, ads and video before they load
+    GIF_MAX_WIDTH = 1280  # Frames are downscaled to this width while capturing, None keeps the viewport size
 
     screenshotter = WebsiteScreenshotter(
         output_dir=OUTPUT_DIR,
-        max_workers=MAX_WORKERS
+        max_workers=MAX_WORKERS,
+        blocking_profile=BLOCKING_PROFILE,
+        gif_max_width=GIF_MAX_WIDTH
     )
     screenshotter.process_website(URL)
 
@@ -1,26 +1,1573 @@
-from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import base64
+import csv
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.by import By
 from PIL import Image, ImageDraw, ImageFont
+import hashlib
+import io
+import json
 import logging
+import math
 import os
-from typing import List, Dict
+import platform
+import queue
+import re
+import sqlite3
+import threading
+import uuid
+import xml.etree.ElementTree as ET
+from urllib.parse import urlparse
+from urllib.request import Request, urlopen
+from typing import Callable, Iterable, List, Dict, Optional, Union
 from dataclasses import dataclass
 import time
-from selenium.common.exceptions import WebDriverException
 from PIL import ImageFilter
+import numpy as np
+
+from capture_core import (
+    BandedPNGReader,
+    BandedPNGWriter,
+    BlankPageError,
+    Capture,
+    CaptureCache,
+    FullPageStitcher,
+    NetworkIdleTracker,
+    Viewport,
+    classify_failure,
+    retry_delay,
+)
 
 
 @dataclass
-class Viewport:
-    width: int
-    height: int
+class ContentStats:
+    """Pixel statistics used to tell real pages from blank, splash and spinner screens"""
+    white_ratio: float
+    very_light_ratio: float
+    dark_ratio: float
+    entropy: float
+    variance: float
+    dominant_ratio: float
+
+    def has_content(self, min_entropy: float = 0.05, max_variance: float = 100.0,
+                    max_dominant_ratio: float = 0.995) -> bool:
+        # 1. Более 98% чисто белых пикселей - вероятно пустой экран
+        if self.white_ratio > 0.98:
+            return False
+
+        # 2. Более 95% очень светлых пикселей И менее 1% темных - вероятно пустой
+        if self.very_light_ratio > 0.95 and self.dark_ratio < 0.01:
+            return False
+
+        # 3. Практически весь экран одного цвета - заливка или спиннер на тёмном фоне.
+        # Редкие страницы (логин на белом фоне) занимают фоном ~95% и проходят
+        if self.dominant_ratio > max_dominant_ratio:
+            return False
+
+        # 4. Почти нет деталей по яркости и нет контраста - однотонный кадр
+        if self.entropy < min_entropy and self.variance < max_variance:
+            return False
+
+        return True
+
+
+def analyze_content(image: Image.Image, top: int = 0, bottom: int = 0,
+                    max_samples: int = 250_000) -> ContentStats:
+    """
+    Compute content statistics in one vectorized pass over a strided pixel grid.
+
+    ``top``/``bottom`` rows are ignored (browser UI). Large images are sampled
+    with a stride so that roughly ``max_samples`` pixels are inspected, which
+    keeps the check cheap enough to run on every GIF frame.
+    """
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    pixels = np.asarray(image)
+    pixels = pixels[top:pixels.shape[0] - bottom] if pixels.shape[0] > top + bottom else pixels
+
+    stride = max(1, int(math.sqrt(pixels.shape[0] * pixels.shape[1] / max_samples)))
+    sample = pixels[::stride, ::stride].reshape(-1, 3)
+    total = len(sample)
+    if total == 0:
+        return ContentStats(1.0, 1.0, 0.0, 0.0, 0.0, 1.0)
+
+    channel_min = sample.min(axis=1)
+
+    luminance = (sample @ np.array([299, 587, 114], dtype=np.uint32)) // 1000
+    histogram = np.bincount(luminance, minlength=256) / total
+    histogram = histogram[histogram > 0]
+
+    # 4 bits per channel is enough to group anti-aliased shades of one colour
+    quantized = sample >> 4
+    colour_index = (quantized[:, 0].astype(np.uint16) << 8) | (quantized[:, 1].astype(np.uint16) << 4) | quantized[:, 2]
+
+    return ContentStats(
+        white_ratio=float(np.count_nonzero(channel_min > 250)) / total,
+        very_light_ratio=float(np.count_nonzero(channel_min > 240)) / total,
+        dark_ratio=float(np.count_nonzero(channel_min < 200)) / total,
+        entropy=max(0.0, float(-(histogram * np.log2(histogram)).sum())),
+        variance=float(luminance.var()),
+        dominant_ratio=float(np.bincount(colour_index, minlength=4096).max()) / total,
+    )
+
+
+@dataclass(frozen=True)
+class CaptureMode:
+    """What a capture needs besides loading the page and waiting for it to settle"""
     name: str
-    dpr: float
-    user_agent: str
+    browser_ui: bool  # Frame the page with the composited phone chrome
+    hydration: bool  # Run HYDRATION_SCRIPT, which re-attaches stylesheets and forces a restyle
+    full_page: bool = False  # Load lazy content once and capture the whole document height
+
+
+CAPTURE_MODES = {
+    # Untouched page at the full viewport size, for visual regression
+    'viewport': CaptureMode('viewport', browser_ui=False, hydration=False),
+    # Page between the browser bars, as a phone would show it
+    'device': CaptureMode('device', browser_ui=True, hydration=True),
+    # Whole document, stitched from tiles when it is taller than one GPU texture
+    'full_page': CaptureMode('full_page', browser_ui=False, hydration=True, full_page=True),
+}
+
+
+# Network.setBlockedURLs patterns, '*' matches any run of characters
+BLOCKED_URL_PATTERNS = {
+    'analytics': [
+        '*google-analytics.com*', '*googletagmanager.com*', '*analytics.google.com*',
+        '*segment.io*', '*cdn.segment.com*', '*mixpanel.com*', '*amplitude.com*',
+        '*hotjar.com*', '*clarity.ms*', '*fullstory.com*', '*heapanalytics.com*',
+        '*mc.yandex.ru*', '*plausible.io*', '*newrelic.com*', '*nr-data.net*',
+    ],
+    'ads': [
+        '*doubleclick.net*', '*googlesyndication.com*', '*googleadservices.com*',
+        '*adservice.google.*', '*amazon-adsystem.com*', '*adnxs.com*', '*criteo.com*',
+        '*criteo.net*', '*taboola.com*', '*outbrain.com*', '*pubmatic.com*', '*rubiconproject.com*',
+    ],
+    'trackers': [
+        '*connect.facebook.net*', '*facebook.com/tr*', '*bat.bing.com*', '*snap.licdn.com*',
+        '*px.ads.linkedin.com*', '*analytics.tiktok.com*', '*static.ads-twitter.com*',
+        '*sc-static.net*', '*ct.pinterest.com*', '*quantserve.com*', '*scorecardresearch.com*',
+    ],
+    'video': [
+        '*.m3u8*', '*.mpd*', '*.mp4*', '*.webm*', '*googlevideo.com*', '*vimeocdn.com*',
+    ],
+}
+
+# From full fidelity to fastest; every profile also blocks what the previous ones block
+BLOCKING_PROFILES = {
+    'none': (),
+    'privacy': ('analytics', 'trackers'),
+    'lean': ('analytics', 'trackers', 'ads'),
+    'fast': ('analytics', 'trackers', 'ads', 'video'),
+}
+
+
+def blocked_url_patterns(profile: str, extra: Optional[List[str]] = None) -> List[str]:
+    if profile not in BLOCKING_PROFILES:
+        raise ValueError(f"Unknown blocking profile: {profile}")
+    patterns = [pattern for category in BLOCKING_PROFILES[profile] for pattern in BLOCKED_URL_PATTERNS[category]]
+    return patterns + list(extra or [])
+
+
+class DriverPool:
+    """
+    Bounded, thread-safe pool of reusable Chrome drivers.
+
+    At most ``max_size`` drivers exist at once; callers block in ``acquire``
+    until one is free. Idle drivers are health-checked before they are handed
+    out and evicted if they crashed, went stale or reached ``max_uses``.
+    """
+
+    def __init__(self, driver_factory: Callable[[], webdriver.Chrome], max_size: int = 3, max_uses: int = 50):
+        self.driver_factory = driver_factory
+        self.max_size = max_size
+        self.max_uses = max_uses
+
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._idle = queue.LifoQueue()
+        self._uses = {}
+        self._drivers = set()
+        self._busy = set()
+        self._lock = threading.Lock()
+        self._closed = False
+
+    @staticmethod
+    def is_healthy(driver: webdriver.Chrome) -> bool:
+        """Cheap round trip to the browser to detect crashed sessions"""
+        try:
+            return driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    def acquire(self) -> webdriver.Chrome:
+        """Check out an idle healthy driver, starting a new one if needed"""
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    driver = self._idle.get_nowait()
+                except queue.Empty:
+                    driver = self.driver_factory()
+                    with self._lock:
+                        self._drivers.add(driver)
+                        self._busy.add(driver)
+                        self._uses[driver] = 0
+                    return driver
+
+                if self._uses.get(driver, 0) < self.max_uses and self.is_healthy(driver):
+                    with self._lock:
+                        self._busy.add(driver)
+                    return driver
+                self.evict(driver)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, driver: webdriver.Chrome, discard: bool = False) -> None:
+        """Return a driver to the pool, evicting it if it is no longer usable or ``discard`` is set"""
+        try:
+            with self._lock:
+                self._busy.discard(driver)
+                self._uses[driver] = self._uses.get(driver, 0) + 1
+                closed = self._closed
+
+            if closed or discard or not self.is_healthy(driver):
+                self.evict(driver)
+                return
+
+            try:
+                origin = driver.execute_script("return location.origin")
+                # Stop timers and network activity of the previous page
+                driver.get("about:blank")
+                driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+                # localStorage, IndexedDB, service workers and CacheStorage would leak into the next capture
+                if origin and origin != 'null':
+                    driver.execute_cdp_cmd('Storage.clearDataForOrigin', {'origin': origin, 'storageTypes': 'all'})
+            except Exception:
+                self.evict(driver)
+                return
+
+            self._idle.put(driver)
+        finally:
+            self._slots.release()
+
+    def busy_pids(self) -> List[int]:
+        """chromedriver pids of the checked-out drivers, their Chrome processes are its children"""
+        with self._lock:
+            drivers = list(self._busy)
+        pids = []
+        for driver in drivers:
+            process = getattr(getattr(driver, 'service', None), 'process', None)
+            if process is not None:
+                pids.append(process.pid)
+        return pids
+
+    def evict(self, driver: webdriver.Chrome) -> None:
+        with self._lock:
+            self._drivers.discard(driver)
+            self._busy.discard(driver)
+            self._uses.pop(driver, None)
+        try:
+            driver.quit()
+        except:
+            pass
+
+    def close(self) -> None:
+        """Quit every driver owned by the pool"""
+        with self._lock:
+            self._closed = True
+            drivers = list(self._drivers)
+        for driver in drivers:
+            self.evict(driver)
+
+
+def process_tree_rss(root_pid: Union[int, Iterable[int]], include_root: bool = True) -> int:
+    """Resident memory in bytes of one or several processes and all of their descendants, read from /proc"""
+    roots = [root_pid] if isinstance(root_pid, int) else list(root_pid)
+    children = {}
+    try:
+        entries = [entry for entry in os.listdir('/proc') if entry.isdigit()]
+    except OSError:
+        return 0
+
+    for entry in entries:
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # The command name may contain spaces, fields resume after ')'
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+            children.setdefault(ppid, []).append(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue
+
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    total = 0
+    pending = list(roots) if include_root else [pid for root in roots for pid in children.get(root, [])]
+    while pending:
+        pid = pending.pop()
+        pending.extend(children.get(pid, []))
+        try:
+            with open(f'/proc/{pid}/statm') as f:
+                total += int(f.read().split()[1]) * page_size
+        except (OSError, IndexError, ValueError):
+            continue
+    return total
+
+
+def available_memory() -> Optional[int]:
+    """MemAvailable from /proc/meminfo in bytes, None where it is not available"""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+class ResourceGovernor:
+    """
+    Pixel-weighted admission control for captures.
+
+    A capture costs the device pixels of its viewport (width x height), a 4K
+    desktop weighs about eight times a laptop. It is admitted while fewer than
+    ``max_workers`` captures run, the load average per CPU is below
+    ``max_load`` and its estimated memory fits into what is available after
+    the reserve and after the memory already promised to running captures.
+    The bytes-per-pixel estimate follows the measured RSS of the browsers
+    returned by ``process_roots``, or of every process started by this one
+    when it is not set. A lone capture is always admitted.
+    """
+
+    def __init__(self, max_workers: int, adaptive: bool = True, reserve_bytes: int = 512 << 20,
+                 bytes_per_pixel: float = 40.0, browser_overhead: int = 200 << 20,
+                 max_load: float = 1.5, poll_interval: float = 0.5,
+                 process_roots: Optional[Callable[[], List[int]]] = None):
+        self.max_workers = max_workers
+        self.adaptive = adaptive
+        self.reserve_bytes = reserve_bytes
+        self.bytes_per_pixel = bytes_per_pixel
+        self.browser_overhead = browser_overhead
+        self.max_load = max_load
+        self.poll_interval = poll_interval
+
+        # Idle pooled browsers and collage workers must not count towards running captures
+        self.process_roots = process_roots
+
+        self.in_flight = 0
+        self.in_flight_pixels = 0
+        self.browser_rss = 0
+        self._measured_at = 0.0
+        self._cond = threading.Condition()
+
+    @staticmethod
+    def pixel_cost(viewport) -> int:
+        return int(viewport.width * viewport.height)
+
+    def estimate(self, pixels: int, captures: int = 1) -> float:
+        return captures * self.browser_overhead + pixels * self.bytes_per_pixel
+
+    def measure(self) -> None:
+        """Refresh the Chrome RSS sample and the bytes-per-pixel estimate, at most once per poll interval"""
+        now = time.monotonic()
+        if now - self._measured_at < self.poll_interval:
+            return
+        self._measured_at = now
+
+        if self.process_roots is None:
+            self.browser_rss = process_tree_rss(os.getpid(), include_root=False)
+        else:
+            self.browser_rss = process_tree_rss(self.process_roots())
+        if self.in_flight_pixels:
+            observed = (self.browser_rss - self.in_flight * self.browser_overhead) / self.in_flight_pixels
+            if observed > 0:
+                # Smooth it, a single sample may catch Chrome mid-allocation
+                self.bytes_per_pixel = 0.8 * self.bytes_per_pixel + 0.2 * observed
+
+    def can_admit(self, pixels: int) -> bool:
+        if self.in_flight == 0:
+            return True
+        if self.in_flight >= self.max_workers:
+            return False
+        if not self.adaptive:
+            return True
+
+        self.measure()
+
+        if hasattr(os, 'getloadavg'):
+            if os.getloadavg()[0] / (os.cpu_count() or 1) > self.max_load:
+                return False
+
+        available = available_memory()
+        if available is None:
+            return True
+
+        # Running captures that have not grown to their estimate yet will still allocate
+        promised = max(0.0, self.estimate(self.in_flight_pixels, self.in_flight) - self.browser_rss)
+        return available - self.reserve_bytes - promised >= self.estimate(pixels)
+
+    def try_acquire(self, pixels: int) -> bool:
+        with self._cond:
+            if not self.can_admit(pixels):
+                return False
+            self.in_flight += 1
+            self.in_flight_pixels += pixels
+            return True
+
+    def acquire(self, pixels: int) -> None:
+        with self._cond:
+            while not self.can_admit(pixels):
+                # Pressure is re-evaluated periodically, not only when a capture finishes
+                self._cond.wait(self.poll_interval)
+            self.in_flight += 1
+            self.in_flight_pixels += pixels
+
+    def release(self, pixels: int) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            self.in_flight_pixels -= pixels
+            self._cond.notify_all()
+
+    @contextmanager
+    def admit(self, pixels: int):
+        self.acquire(pixels)
+        try:
+            yield
+        finally:
+            self.release(pixels)
+
+
+class JobQueue:
+    """
+    Persistent (url, viewport) work queue backed by SQLite.
+
+    Every status change is committed immediately, so a crashed batch run can
+    be resumed: finished jobs are skipped and interrupted ones run again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    url TEXT NOT NULL,
+                    viewport TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    result TEXT,
+                    updated REAL,
+                    PRIMARY KEY (url, viewport)
+                )
+            """)
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS urls (
+                    url TEXT PRIMARY KEY,
+                    collaged INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+
+    def add_jobs(self, url: str, viewport_names: List[str]) -> None:
+        with self._lock, self._db:
+            self._db.execute("INSERT OR IGNORE INTO urls (url) VALUES (?)", (url,))
+            self._db.executemany(
+                "INSERT OR IGNORE INTO jobs (url, viewport) VALUES (?, ?)",
+                [(url, name) for name in viewport_names]
+            )
+
+    def requeue_interrupted(self, retry_failed: bool = False) -> None:
+        """Put jobs that were running when the previous run died back in the queue"""
+        statuses = ('running', 'failed') if retry_failed else ('running',)
+        with self._lock, self._db:
+            self._db.execute(
+                f"UPDATE jobs SET status = 'pending' WHERE status IN ({','.join('?' * len(statuses))})",
+                statuses
+            )
+            if retry_failed:
+                self._db.execute("UPDATE urls SET collaged = 0")
+
+    def pending(self) -> List[tuple]:
+        with self._lock:
+            return self._db.execute(
+                "SELECT url, viewport FROM jobs WHERE status = 'pending' ORDER BY rowid"
+            ).fetchall()
+
+    def mark(self, url: str, viewport_name: str, status: str, result: Optional[Dict] = None) -> None:
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, updated = ? WHERE url = ? AND viewport = ?",
+                (status, self.serialize(result), time.time(), url, viewport_name)
+            )
+
+    @staticmethod
+    def serialize(result: Optional[Dict]) -> Optional[str]:
+        # Decoded images stay in memory, only the metadata is persisted
+        if not result:
+            return None
+        return json.dumps({key: value for key, value in result.items() if key != 'image'})
+
+    def remaining(self, url: str) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE url = ? AND status IN ('pending', 'running')", (url,)
+            ).fetchone()[0]
+
+    def results(self, url: str) -> List[Dict]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT result FROM jobs WHERE url = ? AND status = 'done' ORDER BY rowid", (url,)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def uncollaged(self) -> List[str]:
+        """URLs whose captures are all finished but whose collages were never built"""
+        with self._lock:
+            rows = self._db.execute("""
+                SELECT url FROM urls WHERE collaged = 0 AND NOT EXISTS (
+                    SELECT 1 FROM jobs WHERE jobs.url = urls.url AND status IN ('pending', 'running')
+                )
+            """).fetchall()
+        return [row[0] for row in rows]
+
+    def mark_collaged(self, url: str) -> None:
+        with self._lock, self._db:
+            self._db.execute("UPDATE urls SET collaged = 1 WHERE url = ?", (url,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class StageTimer:
+    """
+    Thread-safe collector of per-viewport stage durations.
+
+    measure() only brackets a stage with perf_counter() and appends a sample
+    under a lock; aggregation into p50/p95 happens once, in summary().
+    """
+
+    FIELDS = ('stage', 'viewport', 'attempt', 'seconds', 'ok')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = []
+
+    @contextmanager
+    def measure(self, stage: str, viewport: Optional[str] = None, attempt: Optional[int] = None):
+        start = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.record(stage, time.perf_counter() - start, viewport, attempt, ok)
+
+    def record(self, stage: str, seconds: float, viewport: Optional[str] = None,
+               attempt: Optional[int] = None, ok: bool = True) -> None:
+        with self._lock:
+            self.samples.append({
+                'stage': stage,
+                'viewport': viewport,
+                'attempt': attempt,
+                'seconds': round(seconds, 6),
+                'ok': ok,
+            })
+
+    def reset(self) -> None:
+        with self._lock:
+            self.samples = []
+
+    def summary(self) -> Dict:
+        """Count, total, p50, p95 and max per stage"""
+        with self._lock:
+            samples = list(self.samples)
+
+        by_stage = {}
+        for sample in samples:
+            by_stage.setdefault(sample['stage'], []).append(sample['seconds'])
+
+        summary = {}
+        for stage, durations in by_stage.items():
+            values = np.array(durations)
+            summary[stage] = {
+                'count': len(durations),
+                'total': round(float(values.sum()), 6),
+                'p50': round(float(np.percentile(values, 50)), 6),
+                'p95': round(float(np.percentile(values, 95)), 6),
+                'max': round(float(values.max()), 6),
+            }
+        return summary
+
+    def write_report(self, output_dir: str, name: str = 'run_report') -> str:
+        """Write the aggregates and raw samples as JSON, and the samples as CSV"""
+        with self._lock:
+            samples = list(self.samples)
+
+        json_path = os.path.join(output_dir, f"{name}.json")
+        with open(json_path, 'w') as f:
+            json.dump({'stages': self.summary(), 'samples': samples}, f, indent=2)
+
+        with open(os.path.join(output_dir, f"{name}.csv"), 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=self.FIELDS)
+            writer.writeheader()
+            writer.writerows(samples)
+
+        return json_path
+
+
+def load_url_list(source: str) -> List[str]:
+    """Read urls from a plain text list (one per line) or from a sitemap / sitemap index"""
+    if source.startswith(('http://', 'https://')):
+        with urlopen(source, timeout=30) as response:
+            content = response.read().decode('utf-8', errors='replace')
+    else:
+        with open(source, encoding='utf-8') as f:
+            content = f.read()
+
+    if not content.lstrip().startswith('<'):
+        return [line.strip() for line in content.splitlines()
+                if line.strip() and not line.strip().startswith('#')]
+
+    root = ET.fromstring(content.strip())
+    namespace = root.tag.split('}')[0] + '}' if root.tag.startswith('{') else ''
+    locations = [loc.text.strip() for loc in root.iter(f'{namespace}loc') if loc.text]
+
+    if root.tag == f'{namespace}sitemapindex':
+        urls = []
+        for sitemap in locations:
+            urls.extend(load_url_list(sitemap))
+        return urls
+    return locations
+
+
+class AssetCache:
+    """Small thread-safe LRU cache for immutable collage assets"""
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, factory: Callable):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        value = factory()
+
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+
+class BrowserUIOverlay:
+    """
+    Pre-rendered mobile browser chrome composited onto raw captures.
+
+    The page is captured with its emulated height reduced by the UI bars, so
+    nothing in the DOM has to move. The status bar and search bar are pasted
+    above the capture and the bottom navigation below it. Bars are drawn once
+    per (viewport width, DPR, hostname, platform) and kept in an AssetCache.
+    """
+
+    # CSS pixel heights of the bars
+    STATUS_BAR = 24
+    STATUS_BAR_IPHONE = 20
+    SEARCH_BAR = 56
+    BOTTOM_NAV = 48
+
+    COLORS = {
+        'status': (0, 0, 0),
+        'toolbar': (42, 42, 42),
+        'search': (58, 58, 58),
+        'nav': (0, 0, 0),
+        'text': (255, 255, 255),
+    }
+
+    def __init__(self, assets: Optional[AssetCache] = None):
+        self.assets = assets or AssetCache(max_entries=32)
+
+    @classmethod
+    def heights(cls, user_agent: str) -> tuple:
+        """CSS pixel heights above and below the page content"""
+        status_bar = cls.STATUS_BAR_IPHONE if 'iphone' in user_agent.lower() else cls.STATUS_BAR
+        return status_bar + cls.SEARCH_BAR, cls.BOTTOM_NAV
+
+    def font(self, size: int):
+        def build():
+            path = CollageRenderer.FONTS.get(platform.system().lower(), CollageRenderer.FONTS['windows'])['regular']
+            try:
+                return ImageFont.truetype(path, size)
+            except Exception:
+                return ImageFont.load_default(size)
+
+        return self.assets.get(('ui_font', size), build)
+
+    def bars(self, width: int, dpr: float, hostname: str, user_agent: str) -> tuple:
+        """Top (status and search bar) and bottom (navigation) images in device pixels"""
+        iphone = 'iphone' in user_agent.lower()
+        key = ('browser_ui', width, dpr, hostname, iphone)
+        return self.assets.get(key, lambda: (self.draw_top(width, dpr, hostname, iphone), self.draw_bottom(width, dpr)))
+
+    def composite(self, image: Image.Image, dpr: float, hostname: str, user_agent: str) -> Image.Image:
+        top, bottom = self.bars(image.width, dpr, hostname, user_agent)
+        canvas = Image.new('RGB', (image.width, top.height + image.height + bottom.height))
+        canvas.paste(top, (0, 0))
+        canvas.paste(image, (0, top.height))
+        canvas.paste(bottom, (0, top.height + image.height))
+        return canvas
+
+    def draw_centered_text(self, draw, x: int, center_y: int, text: str, font, fill) -> int:
+        """Draw text vertically centred on center_y and return its width"""
+        bbox = font.getbbox(text)
+        draw.text((x, center_y - (bbox[1] + bbox[3]) // 2), text, font=font, fill=fill)
+        return bbox[2] - bbox[0]
+
+    def draw_top(self, width: int, dpr: float, hostname: str, iphone: bool) -> Image.Image:
+        px = lambda value: max(1, round(value * dpr))
+        status_height = px(self.STATUS_BAR_IPHONE if iphone else self.STATUS_BAR)
+        image = Image.new('RGB', (width, status_height + px(self.SEARCH_BAR)), self.COLORS['toolbar'])
+        draw = ImageDraw.Draw(image)
+        white = self.COLORS['text']
+
+        # Status bar: time on the left, signal, battery level and battery on the right
+        draw.rectangle((0, 0, width, status_height - 1), fill=self.COLORS['status'])
+        middle = status_height // 2
+        self.draw_centered_text(draw, px(16), middle, '5:52', self.font(px(12)), white)
+
+        right = width - px(16)
+        battery_left = right - px(22)
+        draw.rectangle((battery_left, middle - px(5.5), right - px(2), middle + px(5.5)), outline=white, width=px(1))
+        draw.rectangle((right - px(2), middle - px(2), right, middle + px(2)), fill=white)
+        draw.rectangle((battery_left + px(2), middle - px(3.5), battery_left + px(2) + px(14 * 0.74), middle + px(3.5)), fill=white)
+
+        label_font = self.font(px(12))
+        label_width = label_font.getbbox('74%')[2]
+        self.draw_centered_text(draw, battery_left - px(4) - label_width, middle, '74%', label_font, white)
+
+        bars_right = battery_left - px(8) - label_width
+        for index in range(4):
+            bar_right = bars_right - (3 - index) * px(4)
+            draw.rectangle((bar_right - px(2), middle + px(5) - px(3 + 2.5 * index), bar_right, middle + px(5)), fill=white)
+
+        # Search bar: lock, rounded url field with the hostname, overflow menu
+        middle = status_height + px(self.SEARCH_BAR) // 2
+        lock_left = px(16)
+        draw.rounded_rectangle((lock_left, middle - px(2), lock_left + px(12), middle + px(7)), radius=px(2), fill=white)
+        draw.arc((lock_left + px(2), middle - px(9), lock_left + px(10), middle + px(3)), 180, 360, fill=white, width=px(2))
+
+        for offset in (-6, 0, 6):
+            center = (width - px(18), middle + round(offset * dpr))
+            draw.ellipse((center[0] - px(2), center[1] - px(2), center[0] + px(2), center[1] + px(2)), fill=white)
+
+        field_left = lock_left + px(12) + px(16)
+        field_right = width - px(16) - px(4) - px(16)
+        if field_right > field_left:
+            draw.rounded_rectangle((field_left, middle - px(18), field_right, middle + px(18)),
+                                   radius=px(18), fill=self.COLORS['search'])
+
+            # Shorten long hostnames to the field
+            font = self.font(px(14))
+            available = field_right - field_left - px(32)
+            text = hostname
+            while text and font.getbbox(text)[2] > available:
+                text = text[:-2] + '…' if len(text) > 2 else ''
+            self.draw_centered_text(draw, field_left + px(16), middle, text, font, white)
+
+        return image
+
+    def draw_bottom(self, width: int, dpr: float) -> Image.Image:
+        px = lambda value: max(1, round(value * dpr))
+        image = Image.new('RGB', (width, px(self.BOTTOM_NAV)), self.COLORS['nav'])
+        draw = ImageDraw.Draw(image)
+        white = self.COLORS['text']
+        line = px(2)
+        middle = image.height // 2
+        size = px(8)
+
+        # Back, forward, download, home and tabs, spread like the original flex row
+        inner = width - 2 * px(16)
+        centers = [px(16) + inner * (index + 0.5) / 5 for index in range(5)]
+
+        x = centers[0]
+        draw.line((x - size, middle, x + size, middle), fill=white, width=line)
+        draw.line((x - size, middle, x - size // 2, middle - size // 2), fill=white, width=line)
+        draw.line((x - size, middle, x - size // 2, middle + size // 2), fill=white, width=line)
+
+        x = centers[1]
+        draw.line((x - size, middle, x + size, middle), fill=white, width=line)
+        draw.line((x + size, middle, x + size // 2, middle - size // 2), fill=white, width=line)
+        draw.line((x + size, middle, x + size // 2, middle + size // 2), fill=white, width=line)
+
+        x = centers[2]
+        draw.line((x, middle - size, x, middle + size), fill=white, width=line)
+        draw.line((x, middle + size, x - size // 2, middle + size // 2), fill=white, width=line)
+        draw.line((x, middle + size, x + size // 2, middle + size // 2), fill=white, width=line)
+
+        x = centers[3]
+        draw.polygon([(x - size, middle), (x, middle - size), (x + size, middle)], outline=white, width=line)
+        draw.rectangle((x - size * 0.7, middle, x + size * 0.7, middle + size), outline=white, width=line)
+
+        x = centers[4]
+        draw.rectangle((x - size, middle - size, x + size, middle + size), outline=white, width=line)
+        draw.rectangle((x - size // 2, middle - size // 2, x + size // 2, middle + size // 2), outline=white, width=line)
+
+        return image
+
+
+class CollageRenderer:
+    """
+    Render one PNG collage per device category.
+
+    The canvas is produced in horizontal bands (header, then one band per row
+    of cards) that are streamed to a BandedPNGWriter, and every screenshot is
+    decoded and downscaled only when its band is drawn. Peak memory is one
+    band plus one screenshot, however many devices a category has.
+    """
+
+    # Device categorization and naming
+    CATEGORIES = {
+        'Desktop_Monitors': {
+            'title': 'Desktop Monitors',
+            'subtitle': 'Modern Display Resolutions',
+            'devices': ['desktop-fhd', 'desktop-2k', 'desktop-4k', 'desktop-laptop', 'desktop-laptop-hd']
+        },
+        'MacBooks': {
+            'title': 'MacBook Collection',
+            'subtitle': 'Pro & Air Retina Displays',
+            'devices': ['macbook-pro-15', 'macbook-pro-13', 'macbook-air-15', 'macbook-air-13']
+        },
+        'iPads': {
+            'title': 'iPad Collection',
+            'subtitle': 'Pro & Air Liquid Retina',
+            'devices': ['ipad-pro-12.9', 'ipad-pro-11', 'ipad-10.9', 'ipad-air-5']
+        },
+        'Android_Tablets': {
+            'title': 'Android Tablets',
+            'subtitle': 'Premium Display Gallery',
+            'devices': ['samsung-tab-s9', 'lenovo-tab-p12', 'xiaomi-pad-6']
+        },
+        'Modern_iPhones': {
+            'title': 'Modern iPhones (2024-2023)',
+            'subtitle': 'iPhone 15 Series - Super Retina XDR Displays',
+            'devices': ['iphone-15-pro-max', 'iphone-15-pro', 'iphone-15-plus', 'iphone-15']
+        },
+        'iPhones_2022_2023': {
+            'title': 'iPhones 2022-2023',
+            'subtitle': 'iPhone 14 Series - Super Retina XDR Displays',
+            'devices': ['iphone-14-pro-max', 'iphone-14-pro', 'iphone-14-plus', 'iphone-14']
+        },
+        'iPhones_2021_2022': {
+            'title': 'iPhones 2021-2022',
+            'subtitle': 'iPhone 13 Series - Super Retina XDR Displays',
+            'devices': ['iphone-13-pro-max', 'iphone-13-pro', 'iphone-13', 'iphone-13-mini']
+        },
+        'iPhones_2020_2021': {
+            'title': 'iPhones 2020-2021',
+            'subtitle': 'iPhone 12 Series - Super Retina XDR Displays',
+            'devices': ['iphone-12-pro-max', 'iphone-12-pro', 'iphone-12', 'iphone-12-mini']
+        },
+        'iPhones_2019_2020': {
+            'title': 'iPhones 2019-2020',
+            'subtitle': 'iPhone 11 Series - Liquid Retina HD & Super Retina XDR',
+            'devices': ['iphone-11-pro-max', 'iphone-11-pro', 'iphone-11']
+        },
+        'iPhones_2018_2019': {
+            'title': 'iPhones 2018-2019',
+            'subtitle': 'iPhone XS/XR Series - Super Retina HD & Liquid Retina HD',
+            'devices': ['iphone-xs-max', 'iphone-xs', 'iphone-xr']
+        },
+        'iPhone_X_2017': {
+            'title': 'iPhone X (2017)',
+            'subtitle': 'Super Retina HD Display',
+            'devices': ['iphone-x']
+        },
+        'iPhones_2017': {
+            'title': 'iPhone 8 Series (2017)',
+            'subtitle': 'Retina HD Displays',
+            'devices': ['iphone-8-plus', 'iphone-8']
+        },
+        'iPhones_2016': {
+            'title': 'iPhone 7 Series (2016)',
+            'subtitle': 'Retina HD Displays',
+            'devices': ['iphone-7-plus', 'iphone-7']
+        },
+        'iPhones_2014_2015': {
+            'title': 'iPhone 6 Series (2014-2015)',
+            'subtitle': 'Retina HD Displays',
+            'devices': ['iphone-6s-plus', 'iphone-6s', 'iphone-6-plus', 'iphone-6']
+        },
+        'iPhones_2012_2013': {
+            'title': 'iPhone 5 Series (2012-2013)',
+            'subtitle': 'Retina Displays',
+            'devices': ['iphone-5s', 'iphone-5c', 'iphone-5']
+        },
+
+        'Android_Phones': {
+            'title': 'Android Phones',
+            'subtitle': 'Flagship & Mid-Range Collection',
+            'devices': ['samsung-s24-ultra', 'samsung-s24', 'samsung-a54', 'pixel-8-pro', 'oneplus-12']
+        },
+        'POCO_Phones': {
+            'title': 'POCO Smartphones',
+            'subtitle': 'Latest POCO Models (2024-2023)',
+            'devices': [
+                'poco-x6-pro',
+                'poco-x6',
+                'poco-m6-pro',
+                'poco-m6',
+                'poco-m5s',
+                'poco-f5-pro',
+                'poco-f5',
+                'poco-x5-pro',
+                'poco-x5'
+            ]
+        },
+        'Design_Presentations': {
+            'title': 'Design Presentations',
+            'subtitle': 'Portfolio & Showcase Formats',
+            'devices': [
+                'presentation-standard',
+                'presentation-wide',
+                'dribbble-shot',
+                'behance-project',
+                'hd-preview',
+                'fullhd-preview',
+                '3-2-ratio',
+                '16-9-ratio'
+            ]
+        },
+    }
+
+    # Friendly device names
+    DEVICE_NAMES = {
+        # Desktop Monitors
+        'desktop-fhd': 'Full HD Display',
+        'desktop-2k': 'QHD Display',
+        'desktop-4k': '4K UHD Display',
+        'desktop-laptop': 'Standard Laptop',
+        'desktop-laptop-hd': 'HD+ Laptop',
+
+        # MacBooks
+        'macbook-pro-15': 'MacBook Pro 15"',
+        'macbook-pro-13': 'MacBook Pro 13"',
+
+        # iPads
+        'ipad-pro-12.9': 'iPad Pro 12.9"',
+        'ipad-pro-11': 'iPad Pro 11"',
+        'ipad-10.9': 'iPad Air',
+
+        # Android Tablets
+        'samsung-tab-s9': 'Galaxy Tab S9',
+        'lenovo-tab-p12': 'Tab P12 Pro',
+        'xiaomi-pad-6': 'Pad 6',
+
+        # iPhone 15 Series
+        'iphone-15-pro-max': 'iPhone 15 Pro Max',
+        'iphone-15-pro': 'iPhone 15 Pro',
+        'iphone-15-plus': 'iPhone 15 Plus',
+        'iphone-15': 'iPhone 15',
+
+        # iPhone 14 Series
+        'iphone-14-pro-max': 'iPhone 14 Pro Max',
+        'iphone-14-pro': 'iPhone 14 Pro',
+        'iphone-14-plus': 'iPhone 14 Plus',
+        'iphone-14': 'iPhone 14',
+
+        # iPhone 13 Series
+        'iphone-13-pro-max': 'iPhone 13 Pro Max',
+        'iphone-13-pro': 'iPhone 13 Pro',
+        'iphone-13': 'iPhone 13',
+        'iphone-13-mini': 'iPhone 13 Mini',
+
+        # iPhone 12 Series
+        'iphone-12-pro-max': 'iPhone 12 Pro Max',
+        'iphone-12-pro': 'iPhone 12 Pro',
+        'iphone-12': 'iPhone 12',
+        'iphone-12-mini': 'iPhone 12 Mini',
+
+        # iPhone 11 Series
+        'iphone-11-pro-max': 'iPhone 11 Pro Max',
+        'iphone-11-pro': 'iPhone 11 Pro',
+        'iphone-11': 'iPhone 11',
+
+        # iPhone XS/XR Series
+        'iphone-xs-max': 'iPhone XS Max',
+        'iphone-xs': 'iPhone XS',
+        'iphone-xr': 'iPhone XR',
+
+        # iPhone X
+        'iphone-x': 'iPhone X',
+
+        # iPhone 8 Series
+        'iphone-8-plus': 'iPhone 8 Plus',
+        'iphone-8': 'iPhone 8',
+
+        # iPhone 7 Series
+        'iphone-7-plus': 'iPhone 7 Plus',
+        'iphone-7': 'iPhone 7',
+
+        # iPhone 6 Series
+        'iphone-6s-plus': 'iPhone 6s Plus',
+        'iphone-6s': 'iPhone 6s',
+        'iphone-6-plus': 'iPhone 6 Plus',
+        'iphone-6': 'iPhone 6',
+
+        # iPhone 5 Series
+        'iphone-5s': 'iPhone 5s',
+        'iphone-5c': 'iPhone 5c',
+        'iphone-5': 'iPhone 5',
+
+        # POCO Phones
+        'poco-x6-pro': 'POCO X6 Pro 5G',
+        'poco-x6': 'POCO X6 5G',
+        'poco-m6-pro': 'POCO M6 Pro 5G',
+        'poco-m6': 'POCO M6',
+        'poco-m5s': 'POCO M5s',
+        'poco-f5-pro': 'POCO F5 Pro 5G',
+        'poco-f5': 'POCO F5 5G',
+        'poco-x5-pro': 'POCO X5 Pro 5G',
+        'poco-x5': 'POCO X5 5G',
+
+        # Android Phones
+        'samsung-s24-ultra': 'Galaxy S24 Ultra',
+        'samsung-s24': 'Galaxy S24',
+        'pixel-8-pro': 'Pixel 8 Pro',
+        'oneplus-12': 'OnePlus 12',
+
+        'macbook-air-15': 'MacBook Air 15"',
+        'macbook-air-13': 'MacBook Air 13"',
+        'ipad-air-5': 'iPad Air 5',
+        'samsung-a54': 'Galaxy A54 5G',
+
+        'presentation-standard': 'Standard Presentation',
+        'presentation-wide': 'Wide Presentation',
+        'dribbble-shot': 'Dribbble Shot',
+        'behance-project': 'Behance Project',
+        'hd-preview': 'HD Preview',
+        'fullhd-preview': 'Full HD Preview',
+        '3-2-ratio': '3:2 Aspect Ratio',
+        '16-9-ratio': '16:9 Aspect Ratio',
+    }
+
+    # Behance-inspired design system
+    DESIGN = {
+        'colors': {
+            'background': '#FFFFFF',  # Clean white background like Behance
+            'card': '#FFFFFF',
+            'text': {
+                'primary': '#000000',  # More contrasting black for titles
+                'secondary': '#444444',  # Dark grey for subtitles
+                'tertiary': '#666666'  # Grey for other text
+            },
+            'border': '#EAEAEA',
+            'shadow': (0, 0, 0, 15)  # Slightly reduced shadow
+        },
+        'spacing': {
+            'margin': 100,  # Increased margins
+            'gutter': 40,
+            'header': 300,  # More space for header
+            'card_padding': 40
+        },
+        'typography': {
+            'title': 96,  # Larger title size
+            'subtitle': 32,  # Larger subtitle size
+            'device_name': 24,
+            'specs': 16
+        }
+    }
+
+    # Font configuration with system fallbacks
+    FONTS = {
+        'windows': {
+            'regular': 'C:/Windows/Fonts/segoeui.ttf',
+            'bold': 'C:/Windows/Fonts/segoeuib.ttf',
+            'light': 'C:/Windows/Fonts/segoeuil.ttf'  # Added light variant
+        },
+        'darwin': {
+            'regular': '/System/Library/Fonts/SFPro-Regular.ttf',
+            'bold': '/System/Library/Fonts/SFPro-Bold.ttf',
+            'light': '/System/Library/Fonts/SFPro-Light.ttf'
+        },
+        'linux': {
+            'regular': '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+            'bold': '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf',
+            'light': '/usr/share/fonts/truetype/dejavu/DejaVuSans-Light.ttf'
+        }
+    }
+
+    def __init__(self, assets: Optional[AssetCache] = None):
+        # Shared across categories and, through the screenshotter, across urls of a batch
+        self.assets = assets or AssetCache()
+
+    @property
+    def fonts(self) -> Dict:
+        return self.assets.get(('fonts', platform.system().lower()), self.load_fonts)
+
+    def load_fonts(self) -> Dict:
+        try:
+            fonts = self.FONTS.get(platform.system().lower(), self.FONTS['windows'])
+            typography = self.DESIGN['typography']
+            return {
+                'title': ImageFont.truetype(fonts['light'], typography['title']),  # Light weight for title
+                'subtitle': ImageFont.truetype(fonts['light'], typography['subtitle']),  # Light weight for subtitle
+                'device': ImageFont.truetype(fonts['bold'], typography['device_name']),
+                'specs': ImageFont.truetype(fonts['regular'], typography['specs']),
+            }
+        except Exception as e:
+            logging.warning(f"Font loading failed: {e}. Using default font.")
+            default_font = ImageFont.load_default()
+            return dict.fromkeys(('title', 'subtitle', 'device', 'specs'), default_font)
+
+    def create_shadow(self, size, radius=8):
+        colour = (0, 0, 0, self.DESIGN['colors']['shadow'][3])
+
+        def build():
+            shadow = Image.new('RGBA', size, (0, 0, 0, 0))
+            draw = ImageDraw.Draw(shadow)
+            draw.rectangle((radius, radius, size[0] - radius, size[1] - radius), fill=colour)
+            return shadow.filter(ImageFilter.GaussianBlur(radius))
+
+        return self.assets.get(('shadow', tuple(size), radius, colour), build)
+
+    def create_card(self, size, colour):
+        return self.assets.get(('card', tuple(size), colour), lambda: Image.new('RGB', size, colour))
+
+    @staticmethod
+    def draw_text(draw, pos, text, font, color, align='center', width=None):
+        """
+        Draw text with alignment support
+
+        Args:
+            draw: ImageDraw object
+            pos: (x, y) position tuple
+            text: text to draw
+            font: font to use
+            color: text color
+            align: alignment ('left', 'center', 'right')
+            width: total width for alignment calculation
+        """
+        bbox = font.getbbox(text)
+        text_width = bbox[2] - bbox[0]
+        x, y = pos
+
+        if align == 'center' and width:
+            x += (width - text_width) // 2
+        elif align == 'right' and width:
+            x += width - text_width
+
+        draw.text((x, y), text, font=font, fill=color)
+        return bbox[3] - bbox[1]
+
+    @staticmethod
+    def open_screenshot(screenshot: Dict, size: tuple):
+        """Reuse the image decoded at capture time, falling back to the top of the file on disk"""
+        if screenshot.get("image") is not None:
+            return nullcontext(screenshot["image"])
+        try:
+            with BandedPNGReader(screenshot["path"]) as reader:
+                # Full-page captures show their first viewport, the rows below are never decoded
+                return reader.read_band(math.ceil(reader.width * size[1] / size[0]) + 1)
+        except ValueError:
+            return Image.open(screenshot["path"])
+
+    @staticmethod
+    def fit_screenshot(img: Image.Image, size: tuple) -> Image.Image:
+        """Downscale cheaply with draft/reduce first, then finish with LANCZOS"""
+        img.draft('RGB', size)
+
+        # Full-page captures show their first viewport
+        visible_height = math.ceil(img.width * size[1] / size[0])
+        if img.height > visible_height + 1:
+            img = img.crop((0, 0, img.width, visible_height))
+        factor = min(img.width // size[0], img.height // size[1])
+        if factor > 1:
+            img = img.reduce(factor)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        return img.resize(size, Image.Resampling.LANCZOS)
+
+    def layout(self, category_shots: List[Dict]) -> Dict:
+        spacing = self.DESIGN['spacing']
+        cols = min(2, len(category_shots))
+
+        # Card dimensions
+        card_width = int((3000 - (2 * spacing['margin']) - ((cols - 1) * spacing['gutter'])) / cols)
+        image_width = card_width - (spacing['card_padding'] * 2)
+
+        # Calculate maximum aspect ratio and card height
+        max_ratio = max(s["height"] / s["width"] for s in category_shots)
+        image_height = int(image_width * max_ratio)
+        card_height = spacing['card_padding'] * 2 + image_height + 120
+
+        # Canvas dimensions
+        rows = (len(category_shots) + cols - 1) // cols
+        canvas_width = spacing['margin'] * 2 + card_width * cols + spacing['gutter'] * (cols - 1)
+        canvas_height = (
+                spacing['margin'] +
+                spacing['header'] +
+                (card_height * rows) +
+                (spacing['gutter'] * (rows - 1)) +
+                spacing['margin']
+        )
+
+        return {
+            'cols': cols,
+            'rows': rows,
+            'card_width': card_width,
+            'card_height': card_height,
+            'image_width': image_width,
+            'canvas_width': canvas_width,
+            'canvas_height': canvas_height,
+        }
+
+    def card_position(self, layout: Dict, idx: int) -> tuple:
+        spacing = self.DESIGN['spacing']
+        row = idx // layout['cols']
+        col = idx % layout['cols']
+        x = spacing['margin'] + (layout['card_width'] + spacing['gutter']) * col
+        y = spacing['margin'] + spacing['header'] + (layout['card_height'] + spacing['gutter']) * row
+        return x, y
+
+    def bands(self, layout: Dict) -> List[tuple]:
+        """
+        Split the canvas into (top, bottom) bands: the header, then one band per
+        card row that reaches halfway into the gutters so shadows are not cut
+        """
+        spacing = self.DESIGN['spacing']
+        half_gutter = spacing['gutter'] // 2
+        edges = [0]
+        for row in range(1, layout['rows']):
+            _, y = self.card_position(layout, row * layout['cols'])
+            edges.append(y - half_gutter)
+        _, first_row_y = self.card_position(layout, 0)
+        edges.insert(1, first_row_y - half_gutter)
+        edges.append(layout['canvas_height'])
+        return list(zip(edges[:-1], edges[1:]))
+
+    def draw_header(self, draw, category_info: Dict, layout: Dict, offset_y: int = 0) -> None:
+        spacing = self.DESIGN['spacing']
+        colors = self.DESIGN['colors']
+
+        # Draw header
+        header_y = spacing['margin'] + 40 - offset_y  # Additional top padding
+        title_height = self.draw_text(
+            draw,
+            (spacing['margin'], header_y),
+            category_info['title'].upper(),  # Title in uppercase
+            self.fonts['title'],
+            colors['text']['primary'],
+            'center',
+            layout['canvas_width'] - (spacing['margin'] * 2)
+        )
+
+        # Draw subtitle
+        subtitle_y = header_y + title_height + 30  # Increased spacing between title and subtitle
+        self.draw_text(
+            draw,
+            (spacing['margin'], subtitle_y),
+            category_info['subtitle'],
+            self.fonts['subtitle'],
+            colors['text']['secondary'],
+            'center',
+            layout['canvas_width'] - (spacing['margin'] * 2)
+        )
+
+    def draw_card(self, canvas: Image.Image, draw, screenshot: Dict, layout: Dict, x: int, y: int) -> None:
+        spacing = self.DESIGN['spacing']
+        colors = self.DESIGN['colors']
+        card_width, card_height = layout['card_width'], layout['card_height']
+
+        # Calculate image dimensions and position
+        display_width = layout['image_width']
+        scale = display_width / screenshot["width"]
+        display_height = int(screenshot["height"] * scale)
+
+        with self.open_screenshot(screenshot, (display_width, display_height)) as img:
+            # Create and apply card shadow
+            shadow = self.create_shadow((card_width + 20, card_height + 20))
+            canvas.paste(shadow, (x - 10, y - 10), shadow)
+
+            # Create card background
+            card = self.create_card((card_width, card_height), colors['card'])
+            canvas.paste(card, (x, y))
+
+            # Resize and paste screenshot
+            img_resized = self.fit_screenshot(img, (display_width, display_height))
+
+            img_x = x + spacing['card_padding']
+            img_y = y + spacing['card_padding']
+            canvas.paste(img_resized, (img_x, img_y))
+
+        # Draw device information
+        info_y = img_y + display_height + 25
+
+        # Device name
+        device_name = self.DEVICE_NAMES.get(screenshot['name'], screenshot['name'])
+        self.draw_text(
+            draw,
+            (img_x, info_y),
+            device_name,
+            self.fonts['device'],
+            colors['text']['primary'],
+            'center',
+            display_width
+        )
+
+        # Technical specifications
+        specs_text = f"{screenshot['width']}×{screenshot['height']} @ {screenshot['dpr']}x"
+        self.draw_text(
+            draw,
+            (img_x, info_y + 35),
+            specs_text,
+            self.fonts['specs'],
+            colors['text']['secondary'],
+            'center',
+            display_width
+        )
+
+    @staticmethod
+    def source_hash(screenshot: Dict) -> str:
+        digest = hashlib.sha256()
+        with open(screenshot["path"], 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def manifest_path(collage_path: str) -> str:
+        return os.path.splitext(collage_path)[0] + '.manifest.json'
+
+    def build_manifest(self, category_info: Dict, category_shots: List[Dict], layout: Dict) -> Dict:
+        """Describe everything a collage was drawn from, so a later run can tell what changed"""
+        cards = []
+        for idx, screenshot in enumerate(category_shots):
+            try:
+                source = self.source_hash(screenshot)
+            except OSError:
+                source = None
+            cards.append({
+                'name': screenshot['name'],
+                'position': list(self.card_position(layout, idx)),
+                'size': [screenshot['width'], screenshot['height'], screenshot['dpr']],
+                'hash': source,
+            })
+        return {
+            'header': [category_info['title'], category_info['subtitle'], platform.system().lower()],
+            'layout': layout,
+            'cards': cards,
+        }
+
+    def load_manifest(self, collage_path: str) -> Optional[Dict]:
+        if not os.path.exists(collage_path):
+            return None
+        try:
+            with open(self.manifest_path(collage_path)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_manifest(self, collage_path: str, manifest: Dict) -> None:
+        path = self.manifest_path(collage_path)
+        with open(path + '.part', 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(path + '.part', path)
+
+    @staticmethod
+    def changed_cards(previous: Optional[Dict], manifest: Dict) -> Optional[set]:
+        """
+        Indices of cards whose source changed, or None when the header or the
+        layout differ and the whole collage has to be redrawn
+        """
+        if previous is None or previous.get('header') != manifest['header'] or previous.get('layout') != manifest['layout']:
+            return None
+        old_cards, new_cards = previous.get('cards', []), manifest['cards']
+        if [(c['name'], c['position'], c['size']) for c in old_cards] != \
+                [(c['name'], c['position'], c['size']) for c in new_cards]:
+            return None
+        return {
+            idx for idx, (old, new) in enumerate(zip(old_cards, new_cards))
+            if new['hash'] is None or old['hash'] != new['hash']
+        }
+
+    def render(self, category_name: str, category_info: Dict, category_shots: List[Dict], output_dir: str) -> str:
+        layout = self.layout(category_shots)
+        collage_path = os.path.join(output_dir, f"collage_{category_name}.png")
+
+        manifest = self.build_manifest(category_info, category_shots, layout)
+        changed = self.changed_cards(self.load_manifest(collage_path), manifest)
+        if changed is not None and not changed:
+            logging.info(f"{category_name} collage is up to date")
+            return collage_path
+
+        # Unchanged bands and cards are copied from the previous collage instead of redrawn,
+        # it is read band by band alongside the new one
+        previous = None
+        if changed is not None:
+            try:
+                previous = BandedPNGReader(collage_path)
+                if (previous.width, previous.height) != (layout['canvas_width'], layout['canvas_height']):
+                    raise ValueError("canvas size changed")
+            except Exception as e:
+                logging.warning(f"Cannot reuse {collage_path}: {str(e)}")
+                if previous is not None:
+                    previous.close()
+                previous = None
+                changed = None
+
+        writer = BandedPNGWriter(collage_path, layout['canvas_width'], layout['canvas_height'])
+
+        try:
+            for band_index, (top, bottom) in enumerate(self.bands(layout)):
+                row_cards = []
+                if band_index > 0:
+                    row = band_index - 1
+                    row_cards = range(row * layout['cols'], min((row + 1) * layout['cols'], len(category_shots)))
+
+                if previous is not None:
+                    band = previous.read_band(bottom - top).convert('RGB')
+                    draw = ImageDraw.Draw(band)
+                    row_cards = [idx for idx in row_cards if idx in changed]
+                    for idx in row_cards:
+                        # Clear the old card together with its shadow
+                        x, y = self.card_position(layout, idx)
+                        draw.rectangle(
+                            (x - 10, y - 10 - top, x + layout['card_width'] + 9, y + layout['card_height'] + 9 - top),
+                            fill=self.DESIGN['colors']['background']
+                        )
+                else:
+                    band = Image.new('RGB', (layout['canvas_width'], bottom - top), self.DESIGN['colors']['background'])
+                    draw = ImageDraw.Draw(band)
+                    if band_index == 0:
+                        self.draw_header(draw, category_info, layout, top)
+
+                for idx in row_cards:
+                    screenshot = category_shots[idx]
+                    x, y = self.card_position(layout, idx)
+                    try:
+                        self.draw_card(band, draw, screenshot, layout, x, y - top)
+                    except Exception as e:
+                        logging.error(f"Error processing {screenshot['name']}: {str(e)}")
+                        # Retry this card on the next run
+                        manifest['cards'][idx]['hash'] = None
+                        continue
+
+                writer.write_band(band)
+                del band, draw
+        except Exception:
+            writer.abort()
+            raise
+        finally:
+            if previous is not None:
+                previous.close()
+
+        collage_path = writer.close()
+        self.save_manifest(collage_path, manifest)
+        return collage_path
+
+
+
+# Renderer of the current collage worker process, created on first use
+_worker_renderer = None
+
+
+def render_collage(category_name: str, category_info: Dict, category_shots: List[Dict], output_dir: str) -> tuple:
+    """
+    Process pool entry point; each worker keeps its own renderer and asset cache.
+    Returns the collage path and the render time measured inside the worker.
+    """
+    global _worker_renderer
+    if _worker_renderer is None:
+        _worker_renderer = CollageRenderer()
+    start = time.perf_counter()
+    collage_path = _worker_renderer.render(category_name, category_info, category_shots, output_dir)
+    return collage_path, time.perf_counter() - start
+
+
+class CollageScheduler:
+    """
+    Start each category collage as soon as all of its devices are captured.
+
+    Captures are reported one at a time with add(). Once the last expected
+    device of a category has succeeded or failed, the category is rendered in
+    the process pool (Pillow resizing and PNG encoding are CPU bound), which
+    overlaps collage work with the remaining browser I/O.
+    """
+
+    def __init__(self, executor: Optional[ProcessPoolExecutor], renderer: CollageRenderer,
+                 expected_names: List[str], output_dir: str, timings: Optional[StageTimer] = None):
+        self.executor = executor
+        self.renderer = renderer
+        self.output_dir = output_dir
+        self.timings = timings or StageTimer()
+        self.futures = {}
+
+        self.remaining = {}
+        self.shots = {}
+        for category_name, category_info in CollageRenderer.CATEGORIES.items():
+            names = set(category_info['devices']) & set(expected_names)
+            if names:
+                self.remaining[category_name] = names
+                self.shots[category_name] = []
+
+    def add(self, name: str, screenshot: Optional[Dict]) -> None:
+        """Report a finished capture; a failed one is passed as None"""
+        if screenshot and self.executor is not None:
+            # Workers reopen the saved file, the decoded bitmap would only be kept alive by the results
+            screenshot.pop('image', None)
+        for category_name, remaining in self.remaining.items():
+            if name not in remaining:
+                continue
+            remaining.discard(name)
+            if screenshot:
+                self.shots[category_name].append(screenshot)
+            if not remaining:
+                self.submit(category_name)
+
+    def submit(self, category_name: str) -> None:
+        category_info = CollageRenderer.CATEGORIES[category_name]
+        category_shots = sorted(self.shots.pop(category_name), key=lambda s: category_info['devices'].index(s['name']))
+        if not category_shots:
+            return
+
+        if self.executor is None:
+            try:
+                with self.timings.measure('collage', category_name):
+                    collage_path = self.renderer.render(category_name, category_info, category_shots, self.output_dir)
+                logging.info(f"Saved {category_name} collage to: {collage_path}")
+            except Exception as e:
+                logging.error(f"Collage creation failed for {category_name}: {str(e)}")
+            return
+
+        # Worker processes reopen the saved files instead of receiving pickled bitmaps
+        future = self.executor.submit(render_collage, category_name, category_info, category_shots, self.output_dir)
+        self.futures[future] = category_name
+
+    def wait(self) -> None:
+        for future in as_completed(self.futures):
+            category_name = self.futures[future]
+            try:
+                collage_path, seconds = future.result()
+                self.timings.record('collage', seconds, category_name)
+                logging.info(f"Saved {category_name} collage to: {collage_path}")
+            except Exception as e:
+                logging.error(f"Collage creation failed for {category_name}: {str(e)}")
+        self.futures.clear()
 
 
 class WebsiteScreenshotter:
@@ -210,19 +1757,253 @@ class WebsiteScreenshotter:
         # Viewport(1080, 2400, "oneplus-12", 2.5,
         #          "Mozilla/5.0 (Linux; Android 14; CPH2573) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Mobile Safari/537.36")
     ]
-    def __init__(self, output_dir: str, max_workers: int = 3, simulate_browser_ui: bool = True):
+
+    # Page scripts, shared by the Selenium and the CDP backends
+    PAGE_LOAD_SCRIPT = """
+        return new Promise((resolve) => {
+            if (document.readyState === 'complete') {
+                // Additional check for dynamic content
+                const content = document.body.innerHTML;
+                if (content && content.length > 100) {
+                    resolve();
+                } else {
+                    resolve('empty');
+                }
+            } else {
+                // Settling after load is left to the readiness engine
+                window.addEventListener('load', () => resolve());
+                setTimeout(() => resolve('timeout'), 5000);
+            }
+        });
+    """
+
+    # Resolves once the DOM is quiet, fonts are loaded, visible images are decoded
+    # and layout stays the same for a few animation frames, or after arguments[1] ms
+    READINESS_SCRIPT = """
+        const quietMs = arguments[0];
+        const timeoutMs = arguments[1];
+        const start = performance.now();
+        const signals = {dom: false, fonts: false, images: false, frames: false};
+
+        const fontsReady = (document.fonts ? document.fonts.ready : Promise.resolve())
+            .then(() => { signals.fonts = true; });
+
+        const imagesReady = Promise.all(
+            Array.from(document.images)
+                .filter(img => img.getBoundingClientRect().top < window.innerHeight)
+                .map(img => img.decode().catch(() => {}))
+        ).then(() => { signals.images = true; });
+
+        const domQuiet = new Promise((resolve) => {
+            const done = () => {
+                observer.disconnect();
+                signals.dom = true;
+                resolve();
+            };
+            let timer = setTimeout(done, quietMs);
+            const observer = new MutationObserver(() => {
+                clearTimeout(timer);
+                timer = setTimeout(done, quietMs);
+            });
+            observer.observe(document.documentElement, {
+                childList: true,
+                subtree: true,
+                characterData: true,
+                attributeFilter: ['src', 'srcset']
+            });
+        });
+
+        const framesStable = new Promise((resolve) => {
+            let last = null;
+            let stableFrames = 0;
+            const tick = () => {
+                const root = document.documentElement;
+                const snapshot = `${root.scrollWidth}x${root.scrollHeight}:${document.body.childElementCount}`;
+                stableFrames = snapshot === last ? stableFrames + 1 : 0;
+                last = snapshot;
+                if (stableFrames >= 3) {
+                    signals.frames = true;
+                    resolve();
+                } else {
+                    requestAnimationFrame(tick);
+                }
+            };
+            requestAnimationFrame(tick);
+        });
+
+        return Promise.race([
+            Promise.all([fontsReady, imagesReady, domQuiet, framesStable]),
+            new Promise((resolve) => setTimeout(resolve, timeoutMs))
+        ]).then(() => {
+            signals.elapsed = Math.round(performance.now() - start);
+            return signals;
+        });
+    """
+
+    HYDRATION_SCRIPT = """
+        // Safely check for frameworks
+        try {
+            // Handle React suspense boundaries if present
+            document.querySelectorAll('[data-reactroot]').forEach(element => {
+                if (element.innerHTML.includes('loading')) {
+                    element.style.visibility = 'visible';
+                }
+            });
+
+            // Ensure all styles are loaded
+            const styleSheets = Array.from(document.styleSheets);
+            styleSheets.forEach(sheet => {
+                if (sheet.href) {
+                    const link = document.createElement('link');
+                    link.rel = 'stylesheet';
+                    link.href = sheet.href;
+                    document.head.appendChild(link);
+                }
+            });
+        } catch (e) {
+            // Ignore errors for non-framework sites
+            console.log('Framework-specific handling skipped');
+        }
+    """
+
+    # Scrolls through the page once so lazy images and infinite lists load, up to arguments[0] css px,
+    # then returns to the top and waits briefly for the images it started
+    LAZY_LOAD_SCRIPT = """
+        const maxHeight = arguments[0];
+        document.querySelectorAll('img[loading="lazy"], iframe[loading="lazy"]').forEach(element => {
+            element.loading = 'eager';
+        });
+
+        return new Promise((resolve) => {
+            let y = 0;
+            const step = () => {
+                const end = Math.min(document.documentElement.scrollHeight, maxHeight);
+                if (y >= end) {
+                    window.scrollTo(0, 0);
+                    const pending = Array.from(document.images)
+                        .filter(img => !img.complete)
+                        .map(img => img.decode().catch(() => {}));
+                    Promise.race([
+                        Promise.all(pending),
+                        new Promise((done) => setTimeout(done, 3000))
+                    ]).then(() => resolve(end));
+                    return;
+                }
+                window.scrollTo(0, y);
+                y += window.innerHeight;
+                setTimeout(step, 50);
+            };
+            step();
+        });
+    """
+
+    # Scrolls to arguments[0] css px for the next full-page tile and returns the actual scroll position.
+    # Fixed elements are hidden after the first tile so headers and banners are not repeated
+    TILE_SCROLL_SCRIPT = """
+        const y = arguments[0];
+        if (y === 0) {
+            (window.__fullPageHidden || []).forEach(element => element.style.removeProperty('visibility'));
+            window.__fullPageHidden = null;
+        } else if (!window.__fullPageHidden) {
+            window.__fullPageHidden = Array.from(document.querySelectorAll('body *'))
+                .filter(element => getComputedStyle(element).position === 'fixed');
+            window.__fullPageHidden.forEach(element => element.style.setProperty('visibility', 'hidden', 'important'));
+        }
+
+        window.scrollTo(0, y);
+        return new Promise((resolve) => {
+            requestAnimationFrame(() => requestAnimationFrame(() => resolve(window.scrollY)));
+        });
+    """
+
+    # Full-page limits: taller pages are tiled instead of captured in one texture, and cut off at the maximum
+    FULL_PAGE_MAX_TEXTURE = 16384
+    FULL_PAGE_MAX_HEIGHT = 60000
+
+    # Browser modes: one Chrome per concurrent viewport, or one Chrome per worker with a tab per viewport
+    BROWSER_MODES = ('pool', 'tabs', 'shared')
+
+    # Capture backends: blocking Selenium calls, or asyncio over the DevTools websocket
+    BACKENDS = ('selenium', 'cdp')
+    HTTP_CACHE_MODES = ('off', 'shared', 'replay')
+
+    def __init__(self, output_dir: str, max_workers: int = 3, simulate_browser_ui: bool = True,
+                 browser_mode: str = 'pool', max_tabs_per_browser: int = 8, backend: str = 'selenium',
+                 max_in_flight: int = 16, readiness_timeout: float = 10.0, quiet_period: float = 0.5,
+                 collage_workers: Optional[int] = None, cache_dir: Optional[str] = None,
+                 cache_max_bytes: int = 1 << 30, autoscale: bool = True, http_cache: str = 'off',
+                 http_cache_dir: Optional[str] = None, http_cache_max_bytes: int = 2 << 30,
+                 blocking_profile: str = 'none', blocked_urls: Optional[List[str]] = None,
+                 capture_mode: Optional[str] = None):
+        if browser_mode not in self.BROWSER_MODES:
+            raise ValueError(f"Unknown browser mode: {browser_mode}")
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown backend: {backend}")
+        if http_cache not in self.HTTP_CACHE_MODES:
+            raise ValueError(f"Unknown HTTP cache mode: {http_cache}")
+        if capture_mode is None:
+            capture_mode = 'device' if simulate_browser_ui else 'viewport'
+        if capture_mode not in CAPTURE_MODES:
+            raise ValueError(f"Unknown capture mode: {capture_mode}")
+
         self.output_dir = output_dir
         self.max_workers = max_workers
-        self.simulate_browser_ui = simulate_browser_ui
+        self.capture_mode = CAPTURE_MODES[capture_mode]
+        self.simulate_browser_ui = self.capture_mode.browser_ui
+        self.browser_mode = browser_mode
+        self.max_tabs_per_browser = max_tabs_per_browser
+        self.backend = backend
+        self.max_in_flight = max_in_flight
+        self.readiness_timeout = readiness_timeout
+        self.quiet_period = quiet_period
+
+        # Responses shared by all targets of the CDP backend, see cdp_capture.ResponseCache
+        self.http_cache = http_cache
+        self.http_cache_dir = http_cache_dir or os.path.join(output_dir, '.http_cache')
+        self.http_cache_max_bytes = http_cache_max_bytes
+
+        # Requests that never leave the browser, trading fidelity for faster network idle
+        self.blocking_profile = blocking_profile
+        self.blocked_urls = blocked_url_patterns(blocking_profile, blocked_urls)
 
         self.setup_logging()
 
         # Create output directory if it doesn't exist
         os.makedirs(output_dir, exist_ok=True)
 
-        # Create temp directory for checks
-        self.temp_dir = os.path.join(output_dir, 'temp')
-        os.makedirs(self.temp_dir, exist_ok=True)
+        # Drivers are reused across viewports instead of one Chrome per capture
+        self.driver_pool = DriverPool(self.create_driver, max_size=max_workers)
+        self.collage_renderer = CollageRenderer()
+
+        # Phone chrome is composited onto the capture, the page itself is never rewritten
+        self.browser_ui = BrowserUIOverlay(self.collage_renderer.assets)
+
+        # max_workers is an upper bound, captures are admitted by memory, load and pixel cost
+        self.governor = ResourceGovernor(max_workers, adaptive=autoscale, process_roots=self.driver_pool.busy_pids)
+
+        # Per-viewport stage durations, written to run_report.json/csv after each run
+        self.timings = StageTimer()
+
+        # Screenshots of unchanged pages are reused across runs
+        self.capture_cache = CaptureCache(
+            cache_dir or os.path.join(output_dir, '.capture_cache'), cache_max_bytes
+        ) if cache_max_bytes else None
+        self._fingerprints = {}
+        self._fingerprint_lock = threading.Lock()
+        self._user_agent_variance = {}
+
+        # Category collages render in worker processes, 0 renders them in the calling thread
+        self.collage_workers = min(4, os.cpu_count() or 1) if collage_workers is None else collage_workers
+        self._collage_executor = None
+
+    def close(self) -> None:
+        """Shut down all pooled browser instances and collage workers"""
+        self.driver_pool.close()
+        if self.capture_cache is not None:
+            self.capture_cache.close()
+        if self._collage_executor is not None:
+            self._collage_executor.shutdown()
+            self._collage_executor = None
 
     @staticmethod
     def setup_logging():
@@ -235,6 +2016,11 @@ class WebsiteScreenshotter:
         options = self.get_base_chrome_options()
         options.add_argument("--disable-web-security")  # Handle CORS in dev
         options.add_argument("--allow-insecure-localhost")  # Local dev servers
+        if self.browser_mode == 'tabs':
+            # Keep pages loading at full speed while their tab is in the background
+            options.add_argument("--disable-background-timer-throttling")
+            options.add_argument("--disable-backgrounding-occluded-windows")
+            options.add_argument("--disable-renderer-backgrounding")
         return options
 
     def get_base_chrome_options(self) -> Options:
@@ -250,8 +2036,86 @@ class WebsiteScreenshotter:
         options.add_argument("--disable-software-rasterizer")
         options.add_argument("--disable-smooth-scrolling")
         options.page_load_strategy = 'eager'
+        # Exposes CDP Network events for network idle detection
+        options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
         return options
 
+    def create_driver(self) -> webdriver.Chrome:
+        with self.timings.measure('driver_start'):
+            driver = webdriver.Chrome(options=self.get_chrome_options())
+        driver.set_page_load_timeout(30)
+        driver.set_script_timeout(30)
+        return driver
+
+    @staticmethod
+    def get_physical_size(viewport: Viewport) -> tuple:
+        return int(viewport.width / viewport.dpr), int(viewport.height / viewport.dpr)
+
+    def get_content_size(self, viewport: Viewport) -> tuple:
+        """CSS size of the page area, the viewport minus the composited browser UI if any"""
+        physical_width, physical_height = self.get_physical_size(viewport)
+        if not self.capture_mode.browser_ui:
+            return physical_width, physical_height
+        top, bottom = self.browser_ui.heights(viewport.user_agent)
+        return physical_width, physical_height - top - bottom
+
+    @staticmethod
+    def is_mobile(viewport: Viewport) -> bool:
+        return 'mobile' in viewport.name.lower() or 'iphone' in viewport.name.lower()
+
+    @classmethod
+    def user_agent_class(cls, viewport: Viewport) -> tuple:
+        """
+        Viewports of one class render the same document: same platform token,
+        same Mobile marker and same emulated mobile flag. Device model strings
+        such as the Android build do not split a class.
+        """
+        match = re.search(r'\(([^;)]+)', viewport.user_agent)
+        platform_token = match.group(1).strip().lower() if match else ''
+        if platform_token == 'linux' and 'android' in viewport.user_agent.lower():
+            platform_token = 'android'
+        return platform_token, 'Mobile' in viewport.user_agent, cls.is_mobile(viewport)
+
+    def apply_viewport(self, driver: webdriver.Chrome, viewport: Viewport) -> None:
+        """Reset emulation state of a pooled driver for the given viewport"""
+        physical_width, physical_height = self.get_physical_size(viewport)
+        content_width, content_height = self.get_content_size(viewport)
+
+        # Set viewport size
+        driver.set_window_size(physical_width, physical_height)
+
+        # Configure device metrics, the page only gets the area between the browser bars
+        driver.execute_cdp_cmd('Emulation.setDeviceMetricsOverride', {
+            'width': content_width,
+            'height': content_height,
+            'deviceScaleFactor': viewport.dpr,
+            'mobile': self.is_mobile(viewport),
+            'screenOrientation': {
+                'type': 'portraitPrimary',
+                'angle': 0
+            }
+        })
+
+        # User agent is per checkout now, not a command line switch
+        driver.execute_cdp_cmd('Emulation.setUserAgentOverride', {
+            'userAgent': viewport.user_agent
+        })
+        driver.execute_cdp_cmd('Emulation.setScrollbarsHidden', {'hidden': True})
+
+        if self.blocked_urls:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': self.blocked_urls})
+
+    @contextmanager
+    def checkout_driver(self, viewport: Viewport):
+        """Borrow a driver from the pool configured for the viewport"""
+        driver = self.driver_pool.acquire()
+        try:
+            self.apply_viewport(driver, viewport)
+            yield driver
+        finally:
+            self.driver_pool.release(driver)
+
     def wait_for_page_load(self, driver: webdriver.Chrome, viewport: Viewport) -> None:
         """Enhanced page load detection"""
         wait = WebDriverWait(driver, 30)
@@ -260,412 +2124,529 @@ class WebsiteScreenshotter:
         wait.until(EC.presence_of_element_located((By.TAG_NAME, "body")))
 
         # Wait for complete page load
-        driver.execute_script("""
-            return new Promise((resolve) => {
-                if (document.readyState === 'complete') {
-                    // Additional check for dynamic content
-                    setTimeout(() => {
-                        const content = document.body.innerHTML;
-                        if (content && content.length > 100) {
-                            resolve();
-                        } else {
-                            resolve('empty');
-                        }
-                    }, 1000);
-                } else {
-                    window.addEventListener('load', () => {
-                        setTimeout(resolve, 1000);
-                    });
-                    setTimeout(() => resolve('timeout'), 5000);
-                }
-            });
-        """)
+        driver.execute_script(self.PAGE_LOAD_SCRIPT)
 
     def inject_hydration_handling(self, driver: webdriver.Chrome) -> None:
         """Handle framework-specific elements and styling safely"""
-        driver.execute_script("""
-            // Safely check for frameworks
-            try {
-                // Handle React suspense boundaries if present
-                document.querySelectorAll('[data-reactroot]').forEach(element => {
-                    if (element.innerHTML.includes('loading')) {
-                        element.style.visibility = 'visible';
-                    }
-                });
-
-                // Ensure all styles are loaded
-                const styleSheets = Array.from(document.styleSheets);
-                styleSheets.forEach(sheet => {
-                    if (sheet.href) {
-                        const link = document.createElement('link');
-                        link.rel = 'stylesheet';
-                        link.href = sheet.href;
-                        document.head.appendChild(link);
-                    }
-                });
-            } catch (e) {
-                // Ignore errors for non-framework sites
-                console.log('Framework-specific handling skipped');
-            }
-        """)
+        driver.execute_script(self.HYDRATION_SCRIPT)
 
-    def check_screenshot_content(self, image_path: str) -> bool:
+    def check_screenshot_content(self, image: Union[str, Image.Image]) -> bool:
         """
         Проверяет скриншот на наличие реального контента
-        Возвращает True если контент обнаружен, False если скриншот пустой/белый
+        Принимает путь к файлу или уже декодированное изображение
+        Возвращает True если контент обнаружен, False если скриншот пустой/белый,
+        залит одним цветом (сплэш-экран) или почти без деталей (спиннер)
         """
-        with Image.open(image_path) as img:
-            # Get UI heights for cropping
-            browser_ui_height = {
-                'search_bar': 56,
-                'bottom_nav': 48
-            }
-
-            # Конвертируем в RGB если изображение в другом формате
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
+        if isinstance(image, str):
+            with Image.open(image) as img:
+                return self.check_screenshot_content(img.convert('RGB'))
+
+        # Runs on the raw capture, the browser UI is composited afterwards
+        return analyze_content(image).has_content()
+
+    def capture_screenshot(self, url: str, viewport: Viewport, retry_count: int = 3,
+                           output_dir: Optional[str] = None) -> Dict:
+        cached = self.load_cached_capture(url, viewport, output_dir)
+        if cached:
+            return cached
+
+        pixels = self.governor.pixel_cost(viewport)
+        failures = {}
+        driver = None
+        reload = True
+        try:
+            for attempt in range(retry_count):
+                try:
+                    with self.governor.admit(pixels):
+                        if driver is None:
+                            driver = self.driver_pool.acquire()
+                            self.apply_viewport(driver, viewport)
+                            reload = True
+
+                        if reload:
+                            capture = self.load_and_capture(driver, url, viewport, attempt)
+                        else:
+                            capture = self.recapture_loaded_page(driver, viewport, attempt)
+
+                        # Check content
+                        with self.timings.measure('content_check', viewport.name, attempt):
+                            has_content = self.check_screenshot_content(capture.image)
+                        if not has_content:
+                            raise BlankPageError(
+                                f"Empty or blank screen detected for {viewport.name}"
+                            )
 
-            # Crop out UI areas for content check
-            content_area = img.crop((0, browser_ui_height['search_bar'],
-                                     img.width,
-                                     img.height - browser_ui_height['bottom_nav']))
+                        # If check passed, save final screenshot
+                        return self.save_capture(capture, viewport, output_dir, url)
 
-            # Уменьшаем изображение для быстрого анализа
-            thumb = content_area.resize((100, 100))
+                except Exception as e:
+                    failure = classify_failure(e)
+                    failures[failure] = failures.get(failure, 0) + 1
+                    logging.warning(f"Attempt {attempt + 1} failed for {viewport.name} ({failure}): {str(e)}")
+                    if attempt == retry_count - 1:
+                        logging.error(f"Failed to capture {viewport.name} after {retry_count} attempts")
+                        return None
+
+                    if driver is not None and failure != 'blank' and (
+                            failure == 'crash' or not self.driver_pool.is_healthy(driver)):
+                        # Only a dead browser is replaced, whatever the error looked like
+                        self.driver_pool.release(driver, discard=True)
+                        driver = None
+
+                    # A blank page keeps its load and only waits longer, twice in a row reloads it
+                    reload = not (failure == 'blank' and failures['blank'] % 2 == 1)
+                    time.sleep(retry_delay(failure, failures[failure]))
+        finally:
+            if driver is not None:
+                self.driver_pool.release(driver)
 
-            # Получаем все цвета и их количество
-            pixels = thumb.getcolors(10000)
-            if not pixels:
-                return False
+    @staticmethod
+    def decode_capture(png: bytes) -> Capture:
+        """Decode a PNG screenshot once; the image is reused for checks and collages"""
+        image = Image.open(io.BytesIO(png))
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        else:
+            image.load()
+        return Capture(png, image)
+
+    def composite_browser_ui(self, capture: Capture, viewport: Viewport, url: Optional[str]) -> Capture:
+        """Frame the raw page capture with the cached browser UI bars"""
+        hostname = (urlparse(url).hostname or '') if url else ''
+        image = self.browser_ui.composite(capture.image, viewport.dpr, hostname, viewport.user_agent)
+
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG', compress_level=1)
+        return Capture(buffer.getvalue(), image)
+
+    def save_capture(self, capture: Capture, viewport: Viewport, output_dir: Optional[str] = None,
+                     url: Optional[str] = None) -> Dict:
+        """Write the framed PNG to its final location, the only disk write of a capture"""
+        final_screenshot = os.path.join(
+            output_dir or self.output_dir,
+            f"screenshot-{viewport.name}.png"
+        )
+        if self.capture_mode.browser_ui:
+            with self.timings.measure('composite', viewport.name):
+                capture = self.composite_browser_ui(capture, viewport, url)
+
+        with self.timings.measure('save', viewport.name):
+            cache_key = self.get_cache_key(url, viewport) if url else None
+            if capture.path:
+                # Stitched full pages are already written next to the output
+                os.replace(capture.path, final_screenshot)
+                if cache_key:
+                    self.capture_cache.put_file(cache_key, final_screenshot)
+            else:
+                with open(final_screenshot, 'wb') as f:
+                    f.write(capture.png)
+                if cache_key:
+                    self.capture_cache.put(cache_key, capture.png)
 
-            total_pixels = sum(count for count, _ in pixels)
+        result = self.build_result(viewport, final_screenshot)
+        result["image"] = capture.image
+        return result
 
-            # Проверяем белые и почти белые пиксели
-            white_pixels = sum(
-                count for count, color in pixels
-                if all(c > 250 for c in color)  # Немного строже для белого
-            )
+    def page_fingerprint(self, url: str, user_agent: str) -> Optional[str]:
+        """
+        Cheap change detector for a page: ETag/Last-Modified when the server
+        sends them, otherwise a hash of the HTML. Computed once per run for
+        every (url, user agent) pair; None when the page cannot be fetched.
+        """
+        memo_key = (url, user_agent)
+        with self._fingerprint_lock:
+            if memo_key in self._fingerprints:
+                return self._fingerprints[memo_key]
 
-            # Проверяем очень светлые пиксели
-            very_light_pixels = sum(
-                count for count, color in pixels
-                if all(c > 240 for c in color)
-            )
+        fingerprint = None
+        headers = {'User-Agent': user_agent}
+        try:
+            with urlopen(Request(url, headers=headers, method='HEAD'), timeout=10) as response:
+                validators = [response.headers.get('ETag'), response.headers.get('Last-Modified')]
+            if any(validators):
+                fingerprint = 'validators:' + '|'.join(v or '' for v in validators)
+            else:
+                with urlopen(Request(url, headers=headers), timeout=30) as response:
+                    fingerprint = 'html:' + hashlib.sha256(response.read()).hexdigest()
+        except Exception as e:
+            logging.debug(f"No fingerprint for {url}: {str(e)}")
+
+        with self._fingerprint_lock:
+            self._fingerprints[memo_key] = fingerprint
+        return fingerprint
+
+    def reset_page_probes(self) -> None:
+        """Forget fingerprints and Vary headers of the previous run, pages may have changed since"""
+        with self._fingerprint_lock:
+            self._fingerprints.clear()
+            self._user_agent_variance.clear()
+
+    def get_cache_key(self, url: str, viewport: Viewport) -> Optional[str]:
+        if self.capture_cache is None:
+            return None
+        fingerprint = self.page_fingerprint(url, viewport.user_agent)
+        if fingerprint is None:
+            return None
+        # Blocked requests change what the page renders
+        blocked = hashlib.sha256('\n'.join(sorted(self.blocked_urls)).encode('utf-8')).hexdigest()[:16]
+        return CaptureCache.make_key(url, viewport, fingerprint, f"mode={self.capture_mode.name};blocked={blocked}")
+
+    def load_cached_capture(self, url: str, viewport: Viewport, output_dir: Optional[str] = None) -> Optional[Dict]:
+        """Reuse a cached screenshot when the page has not changed since it was taken"""
+        cache_key = self.get_cache_key(url, viewport)
+        png = self.capture_cache.get(cache_key) if cache_key else None
+        if png is None:
+            return None
+
+        final_screenshot = os.path.join(
+            output_dir or self.output_dir,
+            f"screenshot-{viewport.name}.png"
+        )
+        with open(final_screenshot, 'wb') as f:
+            f.write(png)
+        logging.info(f"Reused cached capture for {viewport.name}")
+        return self.build_result(viewport, final_screenshot)
 
-            # Проверяем наличие темных пикселей (текст, границы и т.д.)
-            dark_pixels = sum(
-                count for count, color in pixels
-                if any(c < 200 for c in color)
-            )
+    def capture_in_tabs(self, url: str, viewports: List[Viewport]) -> List[Dict]:
+        """
+        Capture several viewports with a single browser process.
 
-            # Вычисляем процентные соотношения
-            white_ratio = white_pixels / total_pixels
-            very_light_ratio = very_light_pixels / total_pixels
-            dark_ratio = dark_pixels / total_pixels
+        Every viewport gets its own tab in an isolated browser context. All tabs
+        start navigating before the first one is captured, so the pages load in
+        parallel inside one Chrome. Viewports that fail here are retried through
+        the regular capture_screenshot path.
+        """
+        results, viewports = self.split_cached(url, viewports)
+        failed = []
 
-            # Комплексная проверка контента:
-            # 1. Если более 98% чисто белых пикселей - вероятно пустой экран
-            if white_ratio > 0.98:
-                return False
+        for start in range(0, len(viewports), self.max_tabs_per_browser):
+            batch = viewports[start:start + self.max_tabs_per_browser]
+            pixels = sum(self.governor.pixel_cost(viewport) for viewport in batch)
+            self.governor.acquire(pixels)
+            try:
+                driver = self.driver_pool.acquire()
+            except Exception:
+                self.governor.release(pixels)
+                raise
+            main_handle = None
+            tabs = []
+            try:
+                try:
+                    main_handle = driver.current_window_handle
+                except Exception as e:
+                    # A driver that died while idle; its viewports go through capture_screenshot
+                    logging.warning(f"Browser unusable for tab capture: {str(e)}")
+                    failed.extend(batch)
+                    continue
 
-            # 2. Если более 95% очень светлых пикселей И менее 1% темных - вероятно пустой
-            if very_light_ratio > 0.95 and dark_ratio < 0.01:
-                return False
+                # Open and start loading every tab first
+                for viewport in batch:
+                    try:
+                        context = driver.execute_cdp_cmd('Target.createBrowserContext', {})
+                        target = driver.execute_cdp_cmd('Target.createTarget', {
+                            'url': 'about:blank',
+                            'browserContextId': context['browserContextId']
+                        })
+                        tabs.append((viewport, target['targetId'], context['browserContextId']))
+
+                        driver.switch_to.window(target['targetId'])
+                        self.apply_viewport(driver, viewport)
+                        driver.execute_cdp_cmd('Emulation.setFocusEmulationEnabled', {'enabled': True})
+                        driver.execute_cdp_cmd('Page.navigate', {'url': url})
+                    except Exception as e:
+                        logging.warning(f"Could not open tab for {viewport.name}: {str(e)}")
+                        failed.append(viewport)
 
-            # 3. Если есть заметное количество темных пикселей - вероятно есть контент
-            if dark_ratio > 0.02:  # Более 2% темных пикселей
-                return True
+                # Then capture them one by one
+                for viewport, target_id, _ in tabs:
+                    if viewport in failed:
+                        continue
+                    try:
+                        driver.switch_to.window(target_id)
+                        capture = self.capture_loaded_page(driver, viewport)
+                        with self.timings.measure('content_check', viewport.name, 0):
+                            has_content = self.check_screenshot_content(capture.image)
+                        if not has_content:
+                            raise BlankPageError(f"Empty or blank screen detected for {viewport.name}")
+
+                        results.append(self.save_capture(capture, viewport, url=url))
+                    except Exception as e:
+                        logging.warning(f"Tab capture failed for {viewport.name}: {str(e)}")
+                        failed.append(viewport)
 
-            # По умолчанию считаем что контент есть
-            return True
+            finally:
+                for _, target_id, context_id in tabs:
+                    try:
+                        driver.execute_cdp_cmd('Target.closeTarget', {'targetId': target_id})
+                        driver.execute_cdp_cmd('Target.disposeBrowserContext', {'browserContextId': context_id})
+                    except Exception:
+                        pass
+                if main_handle is not None:
+                    try:
+                        driver.switch_to.window(main_handle)
+                    except Exception:
+                        pass
+                self.driver_pool.release(driver, discard=main_handle is None)
+                self.governor.release(pixels)
+
+        for viewport in failed:
+            result = self.capture_screenshot(url, viewport)
+            if result:
+                results.append(result)
+
+        return results
+
+    def split_cached(self, url: str, viewports: List[Viewport]) -> tuple:
+        """Results served from the capture cache, and the viewports still to capture"""
+        results = []
+        uncached = []
+        for viewport in viewports:
+            cached = self.load_cached_capture(url, viewport)
+            if cached:
+                results.append(cached)
+            else:
+                uncached.append(viewport)
+        return results, uncached
 
-    def capture_screenshot(self, url: str, viewport: Viewport, retry_count: int = 3) -> Dict:
-        for attempt in range(retry_count):
-            driver = None
-            temp_screenshot = None
+    def serves_by_user_agent(self, url: str) -> bool:
+        """True when the response announces that it varies with the user agent"""
+        if url not in self._user_agent_variance:
+            vary = ''
             try:
-                options = self.get_chrome_options()
-                options.add_argument(f'user-agent={viewport.user_agent}')
-                driver = webdriver.Chrome(options=options)
-                driver.set_page_load_timeout(30)
-                driver.set_script_timeout(30)
-
-                # Calculate base physical pixels
-                physical_width = int(viewport.width / viewport.dpr)
-                physical_height = int(viewport.height / viewport.dpr)
-
-                # Add UI heights in actual pixels (not scaled)
-                browser_ui_height = {
-                    'status_bar': 20 if 'iphone' in viewport.name.lower() else 24,
-                    'search_bar': 56,
-                    'bottom_nav': 48
-                }
-                total_ui_height = browser_ui_height['status_bar'] + browser_ui_height['search_bar'] + browser_ui_height[
-                    'bottom_nav']
-
-                # Set viewport size
-                driver.set_window_size(physical_width, physical_height)
-
-                # Configure device metrics
-                driver.execute_cdp_cmd('Emulation.setDeviceMetricsOverride', {
-                    'width': physical_width,
-                    'height': physical_height,
-                    'deviceScaleFactor': viewport.dpr,
-                    'mobile': 'mobile' in viewport.name.lower() or 'iphone' in viewport.name.lower(),
-                    'screenOrientation': {
-                        'type': 'portraitPrimary',
-                        'angle': 0
-                    }
-                })
-
-                driver.get(url)
-
-                # Enhanced waiting for modern frameworks
-                self.wait_for_page_load(driver, viewport)
+                with urlopen(Request(url, method='HEAD'), timeout=10) as response:
+                    vary = response.headers.get('Vary', '')
+            except Exception as e:
+                logging.debug(f"Could not read Vary header of {url}: {str(e)}")
+            lowered = vary.lower()
+            self._user_agent_variance[url] = 'user-agent' in lowered or 'sec-ch-ua' in lowered
+        return self._user_agent_variance[url]
+
+    def group_for_shared_load(self, url: str, viewports: List[Viewport]) -> List[List[Viewport]]:
+        """
+        Group viewports that can share one page load. When the site varies by
+        user agent only identical user agents are grouped, so each distinct
+        user agent still gets its own full load.
+        """
+        by_user_agent = self.serves_by_user_agent(url)
+        groups = {}
+        for viewport in viewports:
+            key = (viewport.user_agent, self.is_mobile(viewport)) if by_user_agent else self.user_agent_class(viewport)
+            groups.setdefault(key, []).append(viewport)
+        return list(groups.values())
+
+    def capture_shared_load(self, url: str, viewports: List[Viewport]) -> List[Dict]:
+        """
+        Load the url once and capture every viewport of the group from it.
+
+        The first viewport is captured as usual. For the others only the device
+        metrics are re-applied in place, then relayout, media queries and any
+        responsive images they trigger settle before the capture. Viewports that
+        fail here are retried through the regular capture_screenshot path.
+        """
+        results, viewports = self.split_cached(url, viewports)
+        failed = []
+
+        if viewports:
+            # One page is rendered at a time, at the size of the largest viewport at most
+            pixels = max(self.governor.pixel_cost(viewport) for viewport in viewports)
+            with self.governor.admit(pixels):
+                driver = self.driver_pool.acquire()
+                try:
+                    network = NetworkIdleTracker()
+                    for index, viewport in enumerate(viewports):
+                        try:
+                            if index == 0:
+                                self.apply_viewport(driver, viewport)
+                                capture = self.load_and_capture(driver, url, viewport)
+                            else:
+                                # Requests triggered by the resize (srcset, media queries) must be tracked
+                                network.reset(driver)
+                                self.apply_viewport(driver, viewport)
+                                capture = self.recapture_loaded_page(driver, viewport, 0, network)
+
+                            with self.timings.measure('content_check', viewport.name, 0):
+                                has_content = self.check_screenshot_content(capture.image)
+                            if not has_content:
+                                raise BlankPageError(f"Empty or blank screen detected for {viewport.name}")
+
+                            results.append(self.save_capture(capture, viewport, url=url))
+                        except Exception as e:
+                            logging.warning(f"Shared load capture failed for {viewport.name}: {str(e)}")
+                            failed.append(viewport)
+                            if index == 0:
+                                # Without a first load there is nothing to resize
+                                failed.extend(viewports[1:])
+                                break
+                finally:
+                    self.driver_pool.release(driver)
+
+        for viewport in failed:
+            result = self.capture_screenshot(url, viewport)
+            if result:
+                results.append(result)
+
+        return results
+
+    def build_result(self, viewport: Viewport, path: str) -> Dict:
+        physical_width, physical_height = self.get_physical_size(viewport)
+        return {
+            "name": viewport.name,
+            "path": path,
+            "width": viewport.width,
+            "height": viewport.height,
+            "dpr": viewport.dpr,
+            "physical_width": physical_width,
+            "physical_height": physical_height,
+            "user_agent": viewport.user_agent
+        }
+
+    def load_and_capture(self, driver: webdriver.Chrome, url: str, viewport: Viewport,
+                         attempt: int = 0) -> Capture:
+        """Load the url in an already configured driver and take an in-memory screenshot"""
+        network = NetworkIdleTracker()
+        network.reset(driver)
+        with self.timings.measure('navigation', viewport.name, attempt):
+            driver.get(url)
+        return self.capture_loaded_page(driver, viewport, attempt, network)
+
+    def wait_until_ready(self, driver: webdriver.Chrome, viewport: Viewport,
+                         network: Optional[NetworkIdleTracker] = None) -> Dict:
+        """
+        Block until the page is visually stable or readiness_timeout expires.
+
+        Network idle comes from the CDP Network events in the performance log,
+        the remaining signals from READINESS_SCRIPT running in the page.
+        """
+        deadline = time.monotonic() + self.readiness_timeout
+        network_idle = network.wait_for_idle(driver, deadline, self.quiet_period) if network else None
+
+        remaining_ms = max(0, int((deadline - time.monotonic()) * 1000))
+        signals = driver.execute_script(self.READINESS_SCRIPT, int(self.quiet_period * 1000), remaining_ms) or {}
+        signals['network'] = network_idle
+
+        if not all(signals.get(key) is not False for key in ('network', 'dom', 'fonts', 'images', 'frames')):
+            logging.debug(f"Readiness ceiling reached for {viewport.name}: {signals}")
+        return signals
+
+    def capture_loaded_page(self, driver: webdriver.Chrome, viewport: Viewport, attempt: int = 0,
+                            network: Optional[NetworkIdleTracker] = None) -> Capture:
+        """Wait for the current page to settle and take an in-memory screenshot"""
+        timings = self.timings
+
+        # Enhanced waiting for modern frameworks
+        with timings.measure('page_load', viewport.name, attempt):
+            self.wait_for_page_load(driver, viewport)
+
+        if self.capture_mode.hydration:
+            with timings.measure('hydration', viewport.name, attempt):
                 self.inject_hydration_handling(driver)
 
-                # Inject browser UI elements
-                driver.execute_script("""
-                   // Status bar height based on platform
-                   const statusBarHeight = navigator.userAgent.toLowerCase().includes('iphone') ? '20px' : '24px';
-                   const searchBarHeight = '56px';
-                   const bottomNavHeight = '48px';
-
-                   // Create status bar
-                   const statusBar = document.createElement('div');
-                   statusBar.style.cssText = `
-                       position: fixed;
-                       top: 0;
-                       left: 0;
-                       right: 0;
-                       height: ${statusBarHeight};
-                       background: #000000;
-                       z-index: 10000;
-                       display: flex;
-                       justify-content: space-between;
-                       align-items: center;
-                       padding: 0 16px;
-                       color: #fff;
-                       font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, Helvetica, Arial, sans-serif;
-                       font-size: 12px;
-                   `;
-
-                   // Left side of status bar (time)
-                   const statusBarLeft = document.createElement('div');
-                   statusBarLeft.textContent = '5:52';
-
-                   // Center of status bar (notch area/camera)
-                   const statusBarCenter = document.createElement('div');
-                   statusBarCenter.style.cssText = `
-                       width: 80px;
-                       height: ${statusBarHeight};
-                       background: #000000;
-                   `;
-
-                   // Right side of status bar (battery, wifi, etc)
-                   const statusBarRight = document.createElement('div');
-                   statusBarRight.style.cssText = `
-                       display: flex;
-                       gap: 4px;
-                       align-items: center;
-                   `;
-                   statusBarRight.innerHTML = '🔋 74% 📶 ⚡';
-
-                   // Create browser UI container
-                   const browserUI = document.createElement('div');
-                   browserUI.style.cssText = `
-                       position: fixed;
-                       top: ${statusBarHeight};
-                       left: 0;
-                       right: 0;
-                       height: ${searchBarHeight};
-                       background: #2A2A2A;
-                       z-index: 9999;
-                       display: flex;
-                       align-items: center;
-                       padding: 0 16px;
-                       font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, Helvetica, Arial, sans-serif;
-                   `;
-
-                   // Create browser controls (left)
-                   const browserControls = document.createElement('div');
-                   browserControls.style.cssText = `
-                       display: flex;
-                       align-items: center;
-                       gap: 8px;
-                   `;
-
-                   // Add lock icon
-                   const lockIcon = document.createElement('span');
-                   lockIcon.innerHTML = '🔒';
-                   lockIcon.style.fontSize = '16px';
-
-                   // Create search bar
-                   const searchBar = document.createElement('div');
-                   searchBar.style.cssText = `
-                       flex: 1;
-                       height: 36px;
-                       background: #3A3A3A;
-                       border-radius: 18px;
-                       margin: 0 8px;
-                       display: flex;
-                       align-items: center;
-                       padding: 0 16px;
-                       color: #fff;
-                       font-size: 14px;
-                   `;
-                   searchBar.textContent = window.location.hostname;
-
-                   // Create browser actions (right)
-                   const browserActions = document.createElement('div');
-                   browserActions.style.cssText = `
-                       display: flex;
-                       align-items: center;
-                       gap: 16px;
-                   `;
-                   browserActions.innerHTML = '⋮';
-
-                   // Create bottom navigation
-                   const bottomNav = document.createElement('div');
-                   bottomNav.style.cssText = `
-                       position: fixed;
-                       bottom: 0;
-                       left: 0;
-                       right: 0;
-                       height: ${bottomNavHeight};
-                       background: #000;
-                       display: flex;
-                       justify-content: space-around;
-                       align-items: center;
-                       z-index: 9999;
-                       padding: 0 16px;
-                   `;
-
-                   // Add navigation buttons
-                   const navButtons = ['←', '→', '↓', '⌂', '⊡'];
-                   navButtons.forEach(button => {
-                       const navButton = document.createElement('button');
-                       navButton.style.cssText = `
-                           background: none;
-                           border: none;
-                           color: #fff;
-                           font-size: 20px;
-                           padding: 8px;
-                           cursor: pointer;
-                       `;
-                       navButton.textContent = button;
-                       bottomNav.appendChild(navButton);
-                   });
-
-                   // Assemble browser UI
-                   browserControls.appendChild(lockIcon);
-                   browserUI.appendChild(browserControls);
-                   browserUI.appendChild(searchBar);
-                   browserUI.appendChild(browserActions);
-
-                   // Assemble status bar
-                   statusBar.appendChild(statusBarLeft);
-                   statusBar.appendChild(statusBarCenter);
-                   statusBar.appendChild(statusBarRight);
-
-                   // Wrap all existing body content in a container
-                   const content = document.createElement('div');
-                   while (document.body.firstChild) {
-                       content.appendChild(document.body.firstChild);
-                   }
-                   document.body.appendChild(content);
-
-                   // Add UI elements to page
-                   document.body.appendChild(statusBar);
-                   document.body.appendChild(browserUI);
-                   document.body.appendChild(bottomNav);
-
-                   // Position content below UI
-                   content.style.cssText = `
-                       position: relative;
-                       top: calc(${statusBarHeight} + ${searchBarHeight});
-                       margin-bottom: calc(${bottomNavHeight} + 20px);
-                       min-height: calc(100vh - ${statusBarHeight} - ${searchBarHeight} - ${bottomNavHeight});
-                   `;
-
-                   // Hide scrollbars
-                   document.documentElement.style.overflow = 'hidden';
-                   document.body.style.overflow = 'hidden';
-
-                   // Add CSS for Firefox and other browsers
-                   const style = document.createElement('style');
-                   style.textContent = `
-                       * {
-                           scrollbar-width: none !important;
-                           -ms-overflow-style: none !important;
-                       }
-                       ::-webkit-scrollbar {
-                           display: none !important;
-                       }
-                   `;
-                   document.head.appendChild(style);
-
-                   // Force layout recalculation
-                   document.body.offsetHeight;
-               """)
-
-                # Wait for any remaining dynamic content
-                time.sleep(3)
-
-                # Reset to exact viewport size before screenshot
-                driver.set_window_size(physical_width, physical_height)
-                time.sleep(1)
-
-                # Make temporary screenshot for checking
-                temp_screenshot = os.path.join(
-                    self.temp_dir,
-                    f"temp_{viewport.name}_{attempt}.png"
-                )
-                driver.save_screenshot(temp_screenshot)
-
-                # Check content
-                if not self.check_screenshot_content(temp_screenshot):
-                    raise WebDriverException(
-                        f"Empty or blank screen detected for {viewport.name}"
-                    )
-
-                # If check passed, save final screenshot
-                final_screenshot = os.path.join(
-                    self.output_dir,
-                    f"screenshot-{viewport.name}.png"
-                )
-                os.replace(temp_screenshot, final_screenshot)
+        if self.capture_mode.full_page:
+            # Once per page load, the tiles only scroll
+            with timings.measure('lazy_load', viewport.name, attempt):
+                driver.execute_script(self.LAZY_LOAD_SCRIPT, self.FULL_PAGE_MAX_HEIGHT)
 
-                return {
-                    "name": viewport.name,
-                    "path": final_screenshot,
-                    "width": viewport.width,
-                    "height": viewport.height,
-                    "dpr": viewport.dpr,
-                    "physical_width": physical_width,
-                    "physical_height": physical_height,
-                    "user_agent": viewport.user_agent
-                }
+        # Wait for any remaining dynamic content
+        with timings.measure('readiness', viewport.name, attempt):
+            self.wait_until_ready(driver, viewport, network)
 
-            except Exception as e:
-                logging.warning(f"Attempt {attempt + 1} failed for {viewport.name}: {str(e)}")
-                if attempt == retry_count - 1:
-                    logging.error(f"Failed to capture {viewport.name} after {retry_count} attempts")
-                    return None
-                time.sleep(3)
+        return self.take_capture(driver, viewport, attempt)
 
-            finally:
-                if driver:
-                    try:
-                        driver.quit()
-                    except:
-                        pass
-                    # Clean up temp file
-                    if temp_screenshot and os.path.exists(temp_screenshot):
-                        try:
-                            os.remove(temp_screenshot)
-                        except:
-                            pass
+    def recapture_loaded_page(self, driver: webdriver.Chrome, viewport: Viewport, attempt: int,
+                              network: Optional[NetworkIdleTracker] = None) -> Capture:
+        """Capture the already loaded page again after another readiness wait, without navigating"""
+        with self.timings.measure('readiness', viewport.name, attempt):
+            self.wait_until_ready(driver, viewport, network)
+        return self.take_capture(driver, viewport, attempt)
+
+    def take_capture(self, driver: webdriver.Chrome, viewport: Viewport, attempt: int = 0) -> Capture:
+        if self.capture_mode.full_page:
+            return self.capture_full_page(driver, viewport, attempt)
+
+        with self.timings.measure('capture', viewport.name, attempt):
+            png = driver.get_screenshot_as_png()
+
+        # Keep the screenshot in memory for checking
+        with self.timings.measure('decode', viewport.name, attempt):
+            return self.decode_capture(png)
+
+    def plan_full_page(self, viewport: Viewport, layout_metrics: Dict) -> tuple:
+        """
+        Css height of the full page, its height in device pixels and the css
+        offsets of its tiles. Offsets are None when one texture holds the page.
+        """
+        content_height = self.get_content_size(viewport)[1]
+        size = layout_metrics.get('cssContentSize') or layout_metrics['contentSize']
+        height = max(content_height, min(math.ceil(size['height']), self.FULL_PAGE_MAX_HEIGHT))
+        device_height = round(height * viewport.dpr)
+        if device_height <= self.FULL_PAGE_MAX_TEXTURE:
+            return height, device_height, None
+        return height, device_height, list(range(0, height, content_height))
+
+    def full_page_screenshot_params(self, viewport: Viewport, height: int) -> Dict:
+        """Page.captureScreenshot parameters for a page that fits one texture"""
+        width = self.get_content_size(viewport)[0]
+        return {
+            'format': 'png',
+            'captureBeyondViewport': True,
+            'clip': {'x': 0, 'y': 0, 'width': width, 'height': height, 'scale': 1},
+        }
+
+    def decode_full_page(self, png: bytes, viewport: Viewport) -> Capture:
+        """Keep only the first viewport decoded, the PNG itself is written as is"""
+        with Image.open(io.BytesIO(png)) as image:
+            visible_height = round(self.get_content_size(viewport)[1] * viewport.dpr)
+            first_viewport = image.convert('RGB').crop((0, 0, image.width, min(image.height, visible_height)))
+        return Capture(png, first_viewport)
+
+    def full_page_spool_path(self) -> str:
+        """Where a stitched page is written before save_capture moves it into place"""
+        return os.path.join(self.output_dir, f".full-page-{uuid.uuid4().hex}.png")
+
+    def capture_full_page(self, driver: webdriver.Chrome, viewport: Viewport, attempt: int = 0) -> Capture:
+        """
+        Capture the whole document. Pages that fit one texture are taken with a
+        single captureBeyondViewport screenshot. Taller pages are scrolled tile
+        by tile and streamed into a PNG, with one decoded tile in memory.
+        """
+        timings = self.timings
+        layout_metrics = driver.execute_cdp_cmd('Page.getLayoutMetrics', {})
+        height, device_height, offsets = self.plan_full_page(viewport, layout_metrics)
+
+        if offsets is None:
+            with timings.measure('capture', viewport.name, attempt):
+                screenshot = driver.execute_cdp_cmd(
+                    'Page.captureScreenshot', self.full_page_screenshot_params(viewport, height)
+                )
+                png = base64.b64decode(screenshot['data'])
+            with timings.measure('decode', viewport.name, attempt):
+                return self.decode_full_page(png, viewport)
+
+        with timings.measure('capture', viewport.name, attempt):
+            driver.execute_script(self.TILE_SCROLL_SCRIPT, 0)
+            png = driver.get_screenshot_as_png()
+        with timings.measure('decode', viewport.name, attempt):
+            first = self.decode_capture(png)
+
+        # A blank page is not worth stitching, the caller's content check rejects it
+        if not self.check_screenshot_content(first.image):
+            return first
+
+        path = self.full_page_spool_path()
+        stitcher = FullPageStitcher(path, first.image.width, device_height)
+        try:
+            with timings.measure('stitch', viewport.name, attempt):
+                stitcher.add(first.image, 0)
+                for offset in offsets[1:]:
+                    scroll_y = driver.execute_script(self.TILE_SCROLL_SCRIPT, offset)
+                    stitcher.add_png(driver.get_screenshot_as_png(), round(scroll_y * viewport.dpr))
+                stitcher.close()
+        except BaseException:
+            stitcher.abort()
+            raise
+
+        logging.info(f"Stitched {len(offsets)} tiles into a {device_height} px full page for {viewport.name}")
+        return Capture(first.png, first.image, path)
 
     def verify_page_content(self, driver: webdriver.Chrome) -> bool:
         """Verify that the page has loaded meaningful content"""
@@ -687,501 +2668,304 @@ class WebsiteScreenshotter:
         except:
             return False
 
-    def create_category_collages(self, screenshots: List[Dict]) -> None:
+    def create_collage_scheduler(self, expected_names: List[str],
+                                 output_dir: Optional[str] = None) -> CollageScheduler:
+        if self.collage_workers and self._collage_executor is None:
+            self._collage_executor = ProcessPoolExecutor(max_workers=self.collage_workers)
+        return CollageScheduler(self._collage_executor, self.collage_renderer, expected_names,
+                                output_dir or self.output_dir, self.timings)
+
+    def create_category_collages(self, screenshots: List[Dict], output_dir: Optional[str] = None) -> None:
+        output_dir = output_dir or self.output_dir
         try:
             screenshots = [s for s in screenshots if s is not None]
             if not screenshots:
                 logging.error("No valid screenshots to create collages")
                 return
 
-            # Device categorization and naming
-            categories = {
-                'Desktop_Monitors': {
-                    'title': 'Desktop Monitors',
-                    'subtitle': 'Modern Display Resolutions',
-                    'devices': ['desktop-fhd', 'desktop-2k', 'desktop-4k', 'desktop-laptop', 'desktop-laptop-hd']
-                },
-                'MacBooks': {
-                    'title': 'MacBook Collection',
-                    'subtitle': 'Pro & Air Retina Displays',
-                    'devices': ['macbook-pro-15', 'macbook-pro-13', 'macbook-air-15', 'macbook-air-13']
-                },
-                'iPads': {
-                    'title': 'iPad Collection',
-                    'subtitle': 'Pro & Air Liquid Retina',
-                    'devices': ['ipad-pro-12.9', 'ipad-pro-11', 'ipad-10.9', 'ipad-air-5']
-                },
-                'Android_Tablets': {
-                    'title': 'Android Tablets',
-                    'subtitle': 'Premium Display Gallery',
-                    'devices': ['samsung-tab-s9', 'lenovo-tab-p12', 'xiaomi-pad-6']
-                },
-                'Modern_iPhones': {
-                    'title': 'Modern iPhones (2024-2023)',
-                    'subtitle': 'iPhone 15 Series - Super Retina XDR Displays',
-                    'devices': ['iphone-15-pro-max', 'iphone-15-pro', 'iphone-15-plus', 'iphone-15']
-                },
-                'iPhones_2022_2023': {
-                    'title': 'iPhones 2022-2023',
-                    'subtitle': 'iPhone 14 Series - Super Retina XDR Displays',
-                    'devices': ['iphone-14-pro-max', 'iphone-14-pro', 'iphone-14-plus', 'iphone-14']
-                },
-                'iPhones_2021_2022': {
-                    'title': 'iPhones 2021-2022',
-                    'subtitle': 'iPhone 13 Series - Super Retina XDR Displays',
-                    'devices': ['iphone-13-pro-max', 'iphone-13-pro', 'iphone-13', 'iphone-13-mini']
-                },
-                'iPhones_2020_2021': {
-                    'title': 'iPhones 2020-2021',
-                    'subtitle': 'iPhone 12 Series - Super Retina XDR Displays',
-                    'devices': ['iphone-12-pro-max', 'iphone-12-pro', 'iphone-12', 'iphone-12-mini']
-                },
-                'iPhones_2019_2020': {
-                    'title': 'iPhones 2019-2020',
-                    'subtitle': 'iPhone 11 Series - Liquid Retina HD & Super Retina XDR',
-                    'devices': ['iphone-11-pro-max', 'iphone-11-pro', 'iphone-11']
-                },
-                'iPhones_2018_2019': {
-                    'title': 'iPhones 2018-2019',
-                    'subtitle': 'iPhone XS/XR Series - Super Retina HD & Liquid Retina HD',
-                    'devices': ['iphone-xs-max', 'iphone-xs', 'iphone-xr']
-                },
-                'iPhone_X_2017': {
-                    'title': 'iPhone X (2017)',
-                    'subtitle': 'Super Retina HD Display',
-                    'devices': ['iphone-x']
-                },
-                'iPhones_2017': {
-                    'title': 'iPhone 8 Series (2017)',
-                    'subtitle': 'Retina HD Displays',
-                    'devices': ['iphone-8-plus', 'iphone-8']
-                },
-                'iPhones_2016': {
-                    'title': 'iPhone 7 Series (2016)',
-                    'subtitle': 'Retina HD Displays',
-                    'devices': ['iphone-7-plus', 'iphone-7']
-                },
-                'iPhones_2014_2015': {
-                    'title': 'iPhone 6 Series (2014-2015)',
-                    'subtitle': 'Retina HD Displays',
-                    'devices': ['iphone-6s-plus', 'iphone-6s', 'iphone-6-plus', 'iphone-6']
-                },
-                'iPhones_2012_2013': {
-                    'title': 'iPhone 5 Series (2012-2013)',
-                    'subtitle': 'Retina Displays',
-                    'devices': ['iphone-5s', 'iphone-5c', 'iphone-5']
-                },
-
-                'Android_Phones': {
-                    'title': 'Android Phones',
-                    'subtitle': 'Flagship & Mid-Range Collection',
-                    'devices': ['samsung-s24-ultra', 'samsung-s24', 'samsung-a54', 'pixel-8-pro', 'oneplus-12']
-                },
-                'POCO_Phones': {
-                    'title': 'POCO Smartphones',
-                    'subtitle': 'Latest POCO Models (2024-2023)',
-                    'devices': [
-                        'poco-x6-pro',
-                        'poco-x6',
-                        'poco-m6-pro',
-                        'poco-m6',
-                        'poco-m5s',
-                        'poco-f5-pro',
-                        'poco-f5',
-                        'poco-x5-pro',
-                        'poco-x5'
-                    ]
-                },
-                'Design_Presentations': {
-                    'title': 'Design Presentations',
-                    'subtitle': 'Portfolio & Showcase Formats',
-                    'devices': [
-                        'presentation-standard',
-                        'presentation-wide',
-                        'dribbble-shot',
-                        'behance-project',
-                        'hd-preview',
-                        'fullhd-preview',
-                        '3-2-ratio',
-                        '16-9-ratio'
-                    ]
-                },
-            }
+            collages = self.create_collage_scheduler([s['name'] for s in screenshots], output_dir)
+            for screenshot in screenshots:
+                collages.add(screenshot['name'], screenshot)
+            collages.wait()
 
-            # Friendly device names
-            device_names = {
-                # Desktop Monitors
-                'desktop-fhd': 'Full HD Display',
-                'desktop-2k': 'QHD Display',
-                'desktop-4k': '4K UHD Display',
-                'desktop-laptop': 'Standard Laptop',
-                'desktop-laptop-hd': 'HD+ Laptop',
-
-                # MacBooks
-                'macbook-pro-15': 'MacBook Pro 15"',
-                'macbook-pro-13': 'MacBook Pro 13"',
-
-                # iPads
-                'ipad-pro-12.9': 'iPad Pro 12.9"',
-                'ipad-pro-11': 'iPad Pro 11"',
-                'ipad-10.9': 'iPad Air',
-
-                # Android Tablets
-                'samsung-tab-s9': 'Galaxy Tab S9',
-                'lenovo-tab-p12': 'Tab P12 Pro',
-                'xiaomi-pad-6': 'Pad 6',
-
-                # iPhone 15 Series
-                'iphone-15-pro-max': 'iPhone 15 Pro Max',
-                'iphone-15-pro': 'iPhone 15 Pro',
-                'iphone-15-plus': 'iPhone 15 Plus',
-                'iphone-15': 'iPhone 15',
-
-                # iPhone 14 Series
-                'iphone-14-pro-max': 'iPhone 14 Pro Max',
-                'iphone-14-pro': 'iPhone 14 Pro',
-                'iphone-14-plus': 'iPhone 14 Plus',
-                'iphone-14': 'iPhone 14',
-
-                # iPhone 13 Series
-                'iphone-13-pro-max': 'iPhone 13 Pro Max',
-                'iphone-13-pro': 'iPhone 13 Pro',
-                'iphone-13': 'iPhone 13',
-                'iphone-13-mini': 'iPhone 13 Mini',
-
-                # iPhone 12 Series
-                'iphone-12-pro-max': 'iPhone 12 Pro Max',
-                'iphone-12-pro': 'iPhone 12 Pro',
-                'iphone-12': 'iPhone 12',
-                'iphone-12-mini': 'iPhone 12 Mini',
-
-                # iPhone 11 Series
-                'iphone-11-pro-max': 'iPhone 11 Pro Max',
-                'iphone-11-pro': 'iPhone 11 Pro',
-                'iphone-11': 'iPhone 11',
-
-                # iPhone XS/XR Series
-                'iphone-xs-max': 'iPhone XS Max',
-                'iphone-xs': 'iPhone XS',
-                'iphone-xr': 'iPhone XR',
-
-                # iPhone X
-                'iphone-x': 'iPhone X',
-
-                # iPhone 8 Series
-                'iphone-8-plus': 'iPhone 8 Plus',
-                'iphone-8': 'iPhone 8',
-
-                # iPhone 7 Series
-                'iphone-7-plus': 'iPhone 7 Plus',
-                'iphone-7': 'iPhone 7',
-
-                # iPhone 6 Series
-                'iphone-6s-plus': 'iPhone 6s Plus',
-                'iphone-6s': 'iPhone 6s',
-                'iphone-6-plus': 'iPhone 6 Plus',
-                'iphone-6': 'iPhone 6',
-
-                # iPhone 5 Series
-                'iphone-5s': 'iPhone 5s',
-                'iphone-5c': 'iPhone 5c',
-                'iphone-5': 'iPhone 5',
-
-                # POCO Phones
-                'poco-x6-pro': 'POCO X6 Pro 5G',
-                'poco-x6': 'POCO X6 5G',
-                'poco-m6-pro': 'POCO M6 Pro 5G',
-                'poco-m6': 'POCO M6',
-                'poco-m5s': 'POCO M5s',
-                'poco-f5-pro': 'POCO F5 Pro 5G',
-                'poco-f5': 'POCO F5 5G',
-                'poco-x5-pro': 'POCO X5 Pro 5G',
-                'poco-x5': 'POCO X5 5G',
-
-                # Android Phones
-                'samsung-s24-ultra': 'Galaxy S24 Ultra',
-                'samsung-s24': 'Galaxy S24',
-                'pixel-8-pro': 'Pixel 8 Pro',
-                'oneplus-12': 'OnePlus 12',
-
-                'macbook-air-15': 'MacBook Air 15"',
-                'macbook-air-13': 'MacBook Air 13"',
-                'ipad-air-5': 'iPad Air 5',
-                'samsung-a54': 'Galaxy A54 5G',
-
-                'presentation-standard': 'Standard Presentation',
-                'presentation-wide': 'Wide Presentation',
-                'dribbble-shot': 'Dribbble Shot',
-                'behance-project': 'Behance Project',
-                'hd-preview': 'HD Preview',
-                'fullhd-preview': 'Full HD Preview',
-                '3-2-ratio': '3:2 Aspect Ratio',
-                '16-9-ratio': '16:9 Aspect Ratio',
-            }
+        except Exception as e:
+            logging.error(f"Collage creation failed: {str(e)}")
 
-            # Behance-inspired design system
-            DESIGN = {
-                'colors': {
-                    'background': '#FFFFFF',  # Clean white background like Behance
-                    'card': '#FFFFFF',
-                    'text': {
-                        'primary': '#000000',  # More contrasting black for titles
-                        'secondary': '#444444',  # Dark grey for subtitles
-                        'tertiary': '#666666'  # Grey for other text
-                    },
-                    'border': '#EAEAEA',
-                    'shadow': (0, 0, 0, 15)  # Slightly reduced shadow
-                },
-                'spacing': {
-                    'margin': 100,  # Increased margins
-                    'gutter': 40,
-                    'header': 300,  # More space for header
-                    'card_padding': 40
-                },
-                'typography': {
-                    'title': 96,  # Larger title size
-                    'subtitle': 32,  # Larger subtitle size
-                    'device_name': 24,
-                    'specs': 16
-                }
-            }
+    def load_timing_history(self) -> Dict[str, float]:
+        """Average seconds per capture attempt of every viewport in the previous run report"""
+        try:
+            with open(os.path.join(self.output_dir, 'run_report.json')) as f:
+                samples = json.load(f).get('samples', [])
+        except (OSError, ValueError):
+            return {}
+
+        totals = {}
+        attempts = {}
+        for sample in samples:
+            name = sample.get('viewport')
+            if not name:
+                continue
+            totals[name] = totals.get(name, 0.0) + sample.get('seconds', 0.0)
+            if sample.get('attempt') is not None:
+                attempts.setdefault(name, set()).add(sample['attempt'])
+        return {name: total / max(1, len(attempts.get(name, ()))) for name, total in totals.items()}
+
+    def order_by_cost(self, viewports: List[Viewport]) -> List[Viewport]:
+        """
+        Most expensive viewports first, so a slow capture does not start last
+        and stretch the end of the run. The cost is the time a viewport took in
+        the previous run; viewports without history are converted from their
+        pixel area at the median seconds per pixel of the others.
+        """
+        history = self.load_timing_history()
+        pixels = {viewport.name: self.governor.pixel_cost(viewport) for viewport in viewports}
 
-            # Font configuration with system fallbacks
-            import platform
-            system = platform.system().lower()
-
-            FONTS = {
-                'windows': {
-                    'regular': 'C:/Windows/Fonts/segoeui.ttf',
-                    'bold': 'C:/Windows/Fonts/segoeuib.ttf',
-                    'light': 'C:/Windows/Fonts/segoeuil.ttf'  # Added light variant
-                },
-                'darwin': {
-                    'regular': '/System/Library/Fonts/SFPro-Regular.ttf',
-                    'bold': '/System/Library/Fonts/SFPro-Bold.ttf',
-                    'light': '/System/Library/Fonts/SFPro-Light.ttf'
-                },
-                'linux': {
-                    'regular': '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
-                    'bold': '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf',
-                    'light': '/usr/share/fonts/truetype/dejavu/DejaVuSans-Light.ttf'
-                }
-            }
+        rates = [history[name] / pixels[name] for name in pixels if name in history and pixels[name]]
+        rate = float(np.median(rates)) if rates else 1.0
+        costs = {name: history.get(name, area * rate) for name, area in pixels.items()}
 
-            try:
-                fonts = FONTS.get(system, FONTS['windows'])
-                title_font = ImageFont.truetype(fonts['light'], DESIGN['typography']['title'])  # Light weight for title
-                subtitle_font = ImageFont.truetype(fonts['light'],
-                                                   DESIGN['typography']['subtitle'])  # Light weight for subtitle
-                device_font = ImageFont.truetype(fonts['bold'], DESIGN['typography']['device_name'])
-                specs_font = ImageFont.truetype(fonts['regular'], DESIGN['typography']['specs'])
-            except Exception as e:
-                logging.warning(f"Font loading failed: {e}. Using default font.")
-                title_font = subtitle_font = device_font = specs_font = ImageFont.load_default()
-
-            def create_shadow(size, radius=8):
-                shadow = Image.new('RGBA', size, (0, 0, 0, 0))
-                draw = ImageDraw.Draw(shadow)
-                draw.rectangle((radius, radius, size[0] - radius, size[1] - radius),
-                               fill=(0, 0, 0, DESIGN['colors']['shadow'][3]))
-                return shadow.filter(ImageFilter.GaussianBlur(radius))
-
-            def draw_text(draw, pos, text, font, color, align='center', width=None):
-                """
-                Draw text with alignment support
-
-                Args:
-                    draw: ImageDraw object
-                    pos: (x, y) position tuple
-                    text: text to draw
-                    font: font to use
-                    color: text color
-                    align: alignment ('left', 'center', 'right')
-                    width: total width for alignment calculation
-                """
-                bbox = font.getbbox(text)
-                text_width = bbox[2] - bbox[0]
-                x, y = pos
-
-                if align == 'center' and width:
-                    x += (width - text_width) // 2
-                elif align == 'right' and width:
-                    x += width - text_width
-
-                draw.text((x, y), text, font=font, fill=color)
-                return bbox[3] - bbox[1]
-
-            # Process each category
-            for category_name, category_info in categories.items():
-                category_shots = [s for s in screenshots if s['name'] in category_info['devices']]
-                if not category_shots:
-                    continue
+        return sorted(viewports, key=lambda viewport: costs[viewport.name], reverse=True)
 
-                # Layout calculations
-                spacing = DESIGN['spacing']
-                cols = min(2, len(category_shots))
-
-                # Card dimensions
-                card_width = int((3000 - (2 * spacing['margin']) - ((cols - 1) * spacing['gutter'])) / cols)
-                image_width = card_width - (spacing['card_padding'] * 2)
-
-                # Calculate maximum aspect ratio and card height
-                max_ratio = max(s["height"] / s["width"] for s in category_shots)
-                image_height = int(image_width * max_ratio)
-                card_height = spacing['card_padding'] * 2 + image_height + 120
-
-                # Canvas dimensions
-                rows = (len(category_shots) + cols - 1) // cols
-                canvas_width = spacing['margin'] * 2 + card_width * cols + spacing['gutter'] * (cols - 1)
-                canvas_height = (
-                        spacing['margin'] +
-                        spacing['header'] +
-                        (card_height * rows) +
-                        (spacing['gutter'] * (rows - 1)) +
-                        spacing['margin']
-                )
+    def process_website(self, url: str) -> None:
+        logging.info(f"Starting capture for: {url}")
+        self.timings.reset()
+        self.reset_page_probes()
 
-                # Create canvas
-                canvas = Image.new('RGB', (canvas_width, canvas_height), DESIGN['colors']['background'])
-                draw = ImageDraw.Draw(canvas)
-
-                # Draw header
-                header_y = spacing['margin'] + 40  # Additional top padding
-                title_height = draw_text(
-                    draw,
-                    (spacing['margin'], header_y),
-                    category_info['title'].upper(),  # Title in uppercase
-                    title_font,
-                    DESIGN['colors']['text']['primary'],
-                    'center',
-                    canvas_width - (spacing['margin'] * 2)
-                )
+        try:
+            if self.backend == 'cdp':
+                import cdp_capture
+                if cdp_capture.is_available():
+                    asyncio.run(self.process_website_async(url))
+                    return
+                logging.warning("CDP backend needs the websockets package and a Chrome binary, using Selenium")
+
+            if self.http_cache != 'off':
+                # Selenium cannot answer Fetch events; pooled drivers still keep their own HTTP cache warm
+                logging.warning("The shared HTTP cache needs the CDP backend, fetching from the network")
+
+            if self.browser_mode == 'tabs':
+                self.process_website_in_tabs(url)
+                return
 
-                # Draw subtitle
-                subtitle_y = header_y + title_height + 30  # Increased spacing between title and subtitle
-                draw_text(
-                    draw,
-                    (spacing['margin'], subtitle_y),
-                    category_info['subtitle'],
-                    subtitle_font,
-                    DESIGN['colors']['text']['secondary'],
-                    'center',
-                    canvas_width - (spacing['margin'] * 2)
+            if self.browser_mode == 'shared':
+                self.process_viewport_groups(
+                    url, self.group_for_shared_load(url, self.order_by_cost(self.VIEWPORTS)), self.capture_shared_load
                 )
+                return
 
-                # Draw device cards
-                for idx, screenshot in enumerate(category_shots):
-                    row = idx // cols
-                    col = idx % cols
+            # Each category collage starts as soon as its devices are done
+            collages = self.create_collage_scheduler([viewport.name for viewport in self.VIEWPORTS])
 
-                    x = spacing['margin'] + (card_width + spacing['gutter']) * col
-                    y = spacing['margin'] + spacing['header'] + (card_height + spacing['gutter']) * row
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                future_to_viewport = {
+                    executor.submit(self.capture_screenshot, url, viewport): viewport
+                    for viewport in self.order_by_cost(self.VIEWPORTS)
+                }
 
+                screenshots = []
+                for future in as_completed(future_to_viewport):
+                    viewport = future_to_viewport[future]
+                    screenshot = None
                     try:
-                        with Image.open(screenshot["path"]) as img:
-                            # Create and apply card shadow
-                            shadow = create_shadow((card_width + 20, card_height + 20))
-                            canvas.paste(shadow, (x - 10, y - 10), shadow)
-
-                            # Create card background
-                            card = Image.new('RGB', (card_width, card_height), DESIGN['colors']['card'])
-                            canvas.paste(card, (x, y))
-
-                            # Calculate image dimensions and position
-                            display_width = image_width
-                            scale = display_width / screenshot["width"]
-                            display_height = int(screenshot["height"] * scale)
-
-                            # Resize and paste screenshot
-                            img_resized = img.resize(
-                                (display_width, display_height),
-                                Image.Resampling.LANCZOS
-                            )
+                        screenshot = future.result()
+                        if screenshot:
+                            screenshots.append(screenshot)
+                            logging.info(f"Captured {viewport.name}")
+                    except Exception as e:
+                        logging.error(f"Error processing {viewport.name}: {str(e)}")
+                    collages.add(viewport.name, screenshot)
 
-                            img_x = x + spacing['card_padding']
-                            img_y = y + spacing['card_padding']
-                            canvas.paste(img_resized, (img_x, img_y))
-
-                            # Draw device information
-                            info_y = img_y + display_height + 25
-
-                            # Device name
-                            device_name = device_names.get(screenshot['name'], screenshot['name'])
-                            draw_text(
-                                draw,
-                                (img_x, info_y),
-                                device_name,
-                                device_font,
-                                DESIGN['colors']['text']['primary'],
-                                'center',
-                                display_width
-                            )
+            if screenshots:
+                collages.wait()
+                logging.info("Process completed successfully")
+            else:
+                logging.error("No screenshots were captured successfully")
+        finally:
+            self.write_run_report()
 
-                            # Technical specifications
-                            specs_text = f"{screenshot['width']}×{screenshot['height']} @ {screenshot['dpr']}x"
-                            draw_text(
-                                draw,
-                                (img_x, info_y + 35),
-                                specs_text,
-                                specs_font,
-                                DESIGN['colors']['text']['secondary'],
-                                'center',
-                                display_width
-                            )
+    def write_run_report(self, output_dir: Optional[str] = None) -> None:
+        """Write stage timings of the last run and log their p50/p95"""
+        try:
+            report_path = self.timings.write_report(output_dir or self.output_dir)
+        except OSError as e:
+            logging.warning(f"Could not write run report: {str(e)}")
+            return
 
-                    except Exception as e:
-                        logging.error(f"Error processing {screenshot['name']}: {str(e)}")
-                        continue
+        for stage, stats in self.timings.summary().items():
+            logging.info(f"{stage}: n={stats['count']} p50={stats['p50']:.3f}s p95={stats['p95']:.3f}s")
+        logging.info(f"Run report saved to: {report_path}")
 
-                # Save the collage
-                collage_path = os.path.join(
-                    self.output_dir,
-                    f"collage_{category_name}.png"
-                )
-                canvas.save(collage_path, optimize=True, quality=95)
-                logging.info(f"Saved {category_name} collage to: {collage_path}")
+    def process_website_in_tabs(self, url: str) -> None:
+        """Spread the viewports over one browser per worker, one tab per viewport"""
+        workers = min(self.max_workers, len(self.VIEWPORTS))
 
-        except Exception as e:
-            logging.error(f"Collage creation failed: {str(e)}")
+        # Dealing the cost-sorted viewports round robin balances the groups
+        viewports = self.order_by_cost(self.VIEWPORTS)
+        groups = [viewports[i::workers] for i in range(workers)]
+        self.process_viewport_groups(url, groups, self.capture_in_tabs)
 
-    def process_website(self, url: str) -> None:
-        logging.info(f"Starting capture for: {url}")
+    def process_viewport_groups(self, url: str, groups: List[List[Viewport]],
+                                capture_group: Callable[[str, List[Viewport]], List[Dict]]) -> None:
+        """Run capture_group for every group of viewports in parallel and stream the results into collages"""
+        collages = self.create_collage_scheduler([viewport.name for group in groups for viewport in group])
 
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            future_to_viewport = {
-                executor.submit(self.capture_screenshot, url, viewport): viewport
-                for viewport in self.VIEWPORTS
-            }
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(groups)))) as executor:
+            future_to_group = {executor.submit(capture_group, url, group): group for group in groups}
 
             screenshots = []
-            for future in future_to_viewport:
-                viewport = future_to_viewport[future]
+            for future in as_completed(future_to_group):
+                captured = []
                 try:
-                    screenshot = future.result()
-                    if screenshot:
-                        screenshots.append(screenshot)
-                        logging.info(f"Captured {viewport.name}")
+                    for screenshot in future.result():
+                        captured.append(screenshot)
+                        logging.info(f"Captured {screenshot['name']}")
                 except Exception as e:
-                    logging.error(f"Error processing {viewport.name}: {str(e)}")
+                    logging.error(f"Error processing viewport group: {str(e)}")
+
+                screenshots.extend(captured)
+                captured_names = {screenshot['name'] for screenshot in captured}
+                for screenshot in captured:
+                    collages.add(screenshot['name'], screenshot)
+                for viewport in future_to_group[future]:
+                    if viewport.name not in captured_names:
+                        collages.add(viewport.name, None)
+
+        if screenshots:
+            collages.wait()
+            logging.info("Process completed successfully")
+        else:
+            logging.error("No screenshots were captured successfully")
+
+    async def process_website_async(self, url: str) -> None:
+        """Capture all viewports through one Chrome driven over the DevTools websocket"""
+        import cdp_capture
+
+        engine = cdp_capture.AsyncCaptureEngine(self, max_in_flight=self.max_in_flight)
+        await engine.start()
+        # Every running capture is a target of the engine's Chrome, the pool stays idle
+        self.governor.process_roots = engine.busy_pids
+        # Each category collage starts as soon as its devices are done
+        collages = self.create_collage_scheduler([viewport.name for viewport in self.VIEWPORTS])
+        try:
+            screenshots = await engine.capture_all(url, self.order_by_cost(self.VIEWPORTS), collages)
+        finally:
+            self.governor.process_roots = self.driver_pool.busy_pids
+            await engine.stop()
+
+        if screenshots:
+            await asyncio.get_running_loop().run_in_executor(None, collages.wait)
+            logging.info("Process completed successfully")
+        else:
+            logging.error("No screenshots were captured successfully")
+
+
+    def get_url_output_dir(self, url: str) -> str:
+        """Per-url subdirectory used by batch runs"""
+        parsed = urlparse(url)
+        slug = re.sub(r'[^A-Za-z0-9._-]+', '_', parsed.netloc + parsed.path).strip('_')[:80]
+        digest = uuid.uuid5(uuid.NAMESPACE_URL, url).hex[:8]
+        output_dir = os.path.join(self.output_dir, f"{slug or 'site'}-{digest}")
+        os.makedirs(output_dir, exist_ok=True)
+        return output_dir
 
-            if screenshots:
-                # Create category collages
-                self.create_category_collages(screenshots)
-                logging.info("Process completed successfully")
-            else:
-                logging.error("No screenshots were captured successfully")
+    def process_batch(self, source, queue_path: Optional[str] = None, retry_failed: bool = False) -> None:
+        """
+        Capture every viewport of many urls through one shared scheduler.
+
+        ``source`` is a list of urls or the path/url of a text list or sitemap.
+        Progress is kept in a SQLite queue next to the output, running the same
+        batch again resumes where the previous run stopped.
+        """
+        urls = load_url_list(source) if isinstance(source, str) else list(source)
+        job_queue = JobQueue(queue_path or os.path.join(self.output_dir, 'batch_queue.sqlite3'))
+        viewports = {viewport.name: viewport for viewport in self.VIEWPORTS}
+
+        for url in urls:
+            job_queue.add_jobs(url, list(viewports))
+        job_queue.requeue_interrupted(retry_failed)
+
+        # Urls keep their order so their collages finish early, viewports go largest first
+        rank = {viewport.name: index for index, viewport in enumerate(self.order_by_cost(self.VIEWPORTS))}
+        url_index = {url: index for index, url in enumerate(urls)}
+        jobs = [(url, name) for url, name in job_queue.pending() if name in viewports]
+        jobs.sort(key=lambda job: (url_index.get(job[0], len(urls)), rank[job[1]]))
+        logging.info(f"Batch of {len(urls)} urls, {len(jobs)} captures pending")
+        self.timings.reset()
+        self.reset_page_probes()
+
+        def run_job(url: str, viewport: Viewport) -> Optional[Dict]:
+            job_queue.mark(url, viewport.name, 'running')
+            screenshot = self.capture_screenshot(url, viewport, output_dir=self.get_url_output_dir(url))
+            job_queue.mark(url, viewport.name, 'done' if screenshot else 'failed', screenshot)
+            if screenshot:
+                # Collages read results back from the queue, the decoded bitmap is not needed any more
+                screenshot.pop('image', None)
+            return screenshot
+
+        try:
+            # Collages left over from an interrupted run
+            for url in job_queue.uncollaged():
+                self.finish_batch_url(job_queue, url)
+
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                future_to_job = {
+                    executor.submit(run_job, url, viewports[name]): (url, name)
+                    for url, name in jobs
+                }
+
+                for future in as_completed(future_to_job):
+                    url, name = future_to_job.pop(future)
+                    try:
+                        if future.result():
+                            logging.info(f"Captured {name} for {url}")
+                    except Exception as e:
+                        job_queue.mark(url, name, 'failed')
+                        logging.error(f"Error processing {name} for {url}: {str(e)}")
+
+                    if job_queue.remaining(url) == 0:
+                        self.finish_batch_url(job_queue, url)
+
+            logging.info("Batch completed")
+        finally:
+            job_queue.close()
+            self.write_run_report()
+
+    def finish_batch_url(self, job_queue: JobQueue, url: str) -> None:
+        screenshots = job_queue.results(url)
+        if screenshots:
+            self.create_category_collages(screenshots, self.get_url_output_dir(url))
+        else:
+            logging.error(f"No screenshots were captured successfully for {url}")
+        job_queue.mark_collaged(url)
 
 
 def main():
     OUTPUT_DIR = r"C:\Users\user\Downloads\testScript"  # Change this to your desired output directory
     URL = "https://splice.com/"  # Change this to your target URL
-    MAX_WORKERS = 8  # Adjust based on your system's capabilities
+    BATCH_FILE = None  # Path to a url list or sitemap.xml, processed instead of URL when set
+    MAX_WORKERS = 8  # Upper bound, fewer run at once under memory or CPU pressure
+    BROWSER_MODE = 'pool'  # 'tabs' runs one Chrome per worker with a tab per viewport to save memory
+    BACKEND = 'selenium'  # 'cdp' drives Chrome over the DevTools websocket with asyncio
+    HTTP_CACHE = 'off'  # 'shared' reuses subresources within a run, 'replay' serves its recording offline, needs BACKEND = 'cdp'
+    BLOCKING_PROFILE = 'none'  # 'privacy', 'lean' or 'fast' block trackers, ads and video before they load
+    CAPTURE_MODE = 'device'  # 'viewport' captures the untouched page without browser UI, 'full_page' the whole document
 
     screenshotter = WebsiteScreenshotter(
         output_dir=OUTPUT_DIR,
-        max_workers=MAX_WORKERS
+        max_workers=MAX_WORKERS,
+        browser_mode=BROWSER_MODE,
+        backend=BACKEND,
+        http_cache=HTTP_CACHE,
+        blocking_profile=BLOCKING_PROFILE,
+        capture_mode=CAPTURE_MODE
     )
-    screenshotter.process_website(URL)
+    try:
+        if BATCH_FILE:
+            screenshotter.process_batch(BATCH_FILE)
+        else:
+            screenshotter.process_website(URL)
+    finally:
+        screenshotter.close()
 
 
 if __name__ == "__main__":